@@ -1,13 +1,18 @@
+import asyncio
+import hashlib
 import json
 import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 _project_root = Path(__file__).parent.parent.absolute()
 if str(_project_root) not in sys.path:
     sys.path.insert(0, str(_project_root))
 
+import orjson
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -15,9 +20,25 @@ from core.agent_full import AgentFull
 from core.llm import get_llm
 from tools.memory import Memory
 from tools.data_loader import load_project_data
+from tools.matcher import match_exercises
+from tools.analytics import run as analytics_run
+from tools.vector_rag import query as vq, ingest_docs, embedding_backend
+from tools.graph_rag import query as gq, ingest_edges_to_json, ingest_edges_to_neo4j, count_exercises_with_equipment, warm as graph_warm
 
 load_dotenv()
 
+# One pass over the question for the graph "count exercises by equipment" shortcut.
+_GRAPH_COUNT_RE = re.compile(r"(?P<count>policz|zlicz|ile )|(?P<exercise>ćwic)|(?P<dumbbell>hantl|dumbbell)|(?P<bench>ławk|bench)")
+
+# Equipment name -> keywords (EN/PL) that mark it as unavailable in the What-if text.
+_EQUIP_SYNS = {
+    "bench": ("bench", "ławk"),
+    "machine": ("machine", "maszyn"),
+    "cable": ("cable", "kabl"),
+}
+# All synonyms in one alternation, one named group per equipment name.
+_EQUIP_RE = re.compile("|".join(f"(?P<{eq}>" + "|".join(map(re.escape, keys)) + ")" for eq, keys in _EQUIP_SYNS.items()))
+
 st.set_page_config(page_title="GymAdvisor", layout="wide")
 st.title("GymAdvisor")
 st.caption("Dobór ćwiczeń i planów na podstawie profilu, katalogu ćwiczeń oraz bazy wiedzy (dokumenty/graf).")
@@ -27,15 +48,103 @@ if "memory" not in st.session_state:
 if "last_debug" not in st.session_state:
     st.session_state["last_debug"] = {}
 
-llm = get_llm()
-agent_full = AgentFull(llm=llm)
-loaded = load_project_data(".")
+
+@st.cache_resource
+def _get_llm():
+    return get_llm()
+
+
+@st.cache_resource
+def _load_data():
+    return load_project_data(".")
 
 
-def _persist_active_profile(profile: dict) -> None:
-    os.makedirs("data/input", exist_ok=True)
-    with open("data/input/profile.json", "w", encoding="utf-8") as f:
-        json.dump(profile, f, ensure_ascii=False, indent=2)
+@st.cache_resource
+def _warm_graph() -> bool:
+    # once per server process: connect the Neo4j pool and prime its plan/page caches
+    return graph_warm()
+
+
+llm = _get_llm()
+agent_full = AgentFull(llm=llm)
+loaded = _load_data()
+
+
+def _persist_active_profile(profile: dict) -> bool:
+    """Write the profile to data/input/profile.json unless the file already holds it.
+
+    The file is shared by every session, so the check is against its current
+    contents rather than what this session wrote last. Returns True if written.
+    """
+    data = orjson.dumps(profile, option=orjson.OPT_INDENT_2)
+    path = "data/input/profile.json"
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        os.makedirs("data/input", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+@st.cache_data(ttl=60)
+def _load_profile() -> Dict[str, Any]:
+    with open("data/input/profile.json", "rb") as f:
+        return orjson.loads(f.read())
+
+
+def _fingerprint(*paths: str) -> str:
+    """Hash of (path, mtime, size) for every file under the given files/directories."""
+    h = hashlib.blake2b(digest_size=16)
+    for root in paths:
+        files = [root] if os.path.isfile(root) else sorted(
+            os.path.join(d, fn) for d, _, fns in os.walk(root) for fn in fns
+        )
+        for fp in files:
+            stt = os.stat(fp)
+            h.update(f"{fp}:{stt.st_mtime_ns}:{stt.st_size}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _outputs_present(*paths: str) -> Tuple[bool, ...]:
+    return tuple(os.path.exists(p) for p in paths)
+
+
+# The ingests are side effects, so the cache key also covers whether their outputs still exist
+# (a deleted index/graph.json is rebuilt) and, for docs, the embedding backend (switching it
+# needs a re-embed). Kept in memory only: a restart always rebuilds on the first click.
+@st.cache_data(show_spinner=False)
+def _ingest_docs_cached(docs_dir: str, fingerprint: str, outputs: Tuple[bool, ...], backend: str) -> Dict[str, Any]:
+    return ingest_docs(docs_dir)
+
+
+@st.cache_data(show_spinner=False)
+def _ingest_edges_cached(fingerprint: str, outputs: Tuple[bool, ...]) -> Dict[str, Any]:
+    return ingest_edges_to_json()
+
+
+def _shrink(obj: Any, max_items: int = 5, max_text: int = 400, max_edges: int = 30) -> Any:
+    """Copy of a debug payload with long lists/strings cut, so reruns don't re-serialize it all."""
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            if k == "items" and isinstance(v, list):
+                v = v[:max_items]
+            elif k == "edges" and isinstance(v, list):
+                v = v[:max_edges]
+            out[k] = _shrink(v, max_items, max_text, max_edges)
+        return out
+    if isinstance(obj, list):
+        return [_shrink(v, max_items, max_text, max_edges) for v in obj]
+    if isinstance(obj, str) and len(obj) > max_text:
+        return obj[:max_text] + "…"
+    return obj
+
+
+def _set_debug(payload: Dict[str, Any]) -> None:
+    st.session_state["last_debug"] = _shrink(payload)
 
 
 def _set_graph_mode(mode: str) -> None:
@@ -43,27 +152,49 @@ def _set_graph_mode(mode: str) -> None:
 
 
 def _run_matcher(question: str, overrides: Dict[str, Any] | None = None) -> Dict[str, Any]:
-    from tools.matcher import match_exercises
     payload: Dict[str, Any] = overrides or {}
     payload.setdefault("query", question)
     return match_exercises(payload)
 
 
 def _run_analytics(op: Dict[str, Any]) -> Dict[str, Any]:
-    from tools.analytics import run as analytics_run
     return analytics_run(op)
 
 
 def _run_vector(question: str) -> Dict[str, Any]:
-    from tools.vector_rag import query as vq
     return vq(question)
 
 
 def _run_graph(question: str) -> Dict[str, Any]:
-    from tools.graph_rag import query as gq
     return gq(question)
 
 
+def _short_entry(i: int, ex: dict[str, Any]) -> str:
+    lines = [f"**{i}. {ex.get('name') or ex.get('id')}**"]
+    reasons = ex.get("reasons") or []
+    if reasons:
+        lines.append(", ".join(reasons))
+    sb = ex.get("score_breakdown")
+    if isinstance(sb, dict):
+        lines.append("score: " + ", ".join(f"{k}={v}" for k, v in sb.items()))
+    return "  \n".join(lines)
+
+
+def _render_short_list(items: list[dict[str, Any]]):
+    if not items:
+        st.info("Brak wyników.")
+        return
+    st.markdown("\n\n".join(_short_entry(i, ex) for i, ex in enumerate(items[:5], start=1)))
+
+
+async def _run_retrievals(question: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Vector and Graph retrieval run concurrently."""
+    va, ga = await asyncio.gather(
+        asyncio.to_thread(_run_vector, question),
+        asyncio.to_thread(_run_graph, question),
+    )
+    return va, ga
+
 
 with st.sidebar:
     st.header("Profil i dane")
@@ -76,7 +207,8 @@ with st.sidebar:
             labels.append(f"{pid} · {goal}")
         idx = st.selectbox("Profil", list(range(len(profiles))), format_func=lambda i: labels[i])
         active = profiles[idx]
-        _persist_active_profile(active)
+        if _persist_active_profile(active):
+            _load_profile.clear()
         st.caption("Wybrany profil zapisany jako data/input/profile.json")
     else:
         st.info("Brak profili w data/input (profiles.json/profile.json).")
@@ -86,13 +218,19 @@ with st.sidebar:
     c1, c2 = st.columns(2)
     with c1:
         if st.button("Zbuduj indeks dokumentów"):
-            from tools.vector_rag import ingest_docs
-            out = ingest_docs("data/docs")
+            out = _ingest_docs_cached(
+                "data/docs",
+                _fingerprint("data/docs"),
+                _outputs_present(os.path.join(os.getenv("CHROMA_PERSIST_DIR", "data/indexes/chroma"), "chroma.sqlite3")),
+                embedding_backend(),
+            )
             st.success(f"OK: {out}")
     with c2:
         if st.button("Zbuduj graf lokalny"):
-            from tools.graph_rag import ingest_edges_to_json
-            out = ingest_edges_to_json()
+            out = _ingest_edges_cached(
+                _fingerprint("data/graph/edges.csv", "data/catalog/exercises.json"),
+                _outputs_present("data/graph/graph.json"),
+            )
             st.success(f"OK: {out}")
 
     st.divider()
@@ -100,10 +238,10 @@ with st.sidebar:
     graph_mode = st.radio("Źródło relacji", ["Local", "Neo4j"], horizontal=True)
     _set_graph_mode("neo4j" if graph_mode == "Neo4j" else "local")
     if graph_mode == "Neo4j":
+        _warm_graph()
         st.caption("Jeśli Neo4j nie działa na tym urządzeniu, zostaw Local.")
         if st.button("Sync edges.csv → Neo4j"):
             try:
-                from tools.graph_rag import ingest_edges_to_neo4j
                 msg = ingest_edges_to_neo4j("data/graph/edges.csv")
                 st.success(msg)
             except Exception as e:
@@ -134,7 +272,7 @@ with col_left:
         if run:
             op = json.loads(op_text)
             res = _run_analytics(op)
-            st.session_state["last_debug"] = {"task": task, "op": op, "result": res}
+            _set_debug({"task": task, "op": op, "result": res})
             st.subheader("Wynik")
             st.json(res)
 
@@ -144,27 +282,23 @@ with col_left:
         whatif = st.text_area("Zmiana (what-if)", height=90, value="Usuń sprzęt: bench. Brak maszyn i kabli przez 7 dni.")
         run = st.button("Uruchom", type="primary")
         if run:
-            base = _run_matcher(base_q, overrides={})
-
-            removed = []
-            txt = whatif.lower()
-            if "bench" in txt or "ławk" in txt:
-                removed.append("bench")
-            if "machine" in txt or "maszyn" in txt:
-                removed.append("machine")
-            if "cable" in txt or "kabl" in txt:
-                removed.append("cable")
+            hits = {m.lastgroup for m in _EQUIP_RE.finditer(whatif.lower())}
+            removed = [eq for eq in _EQUIP_SYNS if eq in hits]
 
             overrides = {"equipment_unavailable": removed, "query": base_q + " " + whatif}
             try:
-                prof = json.load(open("data/input/profile.json", "r", encoding="utf-8"))
+                prof = _load_profile()
                 eq = prof.get("equipment_available") or prof.get("equipment") or []
                 eq2 = [e for e in eq if e not in removed]
                 overrides["equipment"] = eq2
             except Exception:
                 pass
 
-            alt = _run_matcher(base_q, overrides=overrides)
+            # baseline and what-if matches are independent; run them side by side like the agent's what_if tool
+            with ThreadPoolExecutor(max_workers=2) as ex:
+                fb = ex.submit(_run_matcher, base_q, {})
+                fw = ex.submit(_run_matcher, base_q, overrides)
+                base, alt = fb.result(), fw.result()
 
             baseline_top = [x.get("id") for x in (base.get("top") or [])[:5] if x.get("id")]
             whatif_top = [x.get("id") for x in (alt.get("top") or [])[:5] if x.get("id")]
@@ -173,28 +307,14 @@ with col_left:
                 "constraints_removed": removed,
                 "baseline_top": baseline_top,
                 "whatif_top": whatif_top,
-                "removed": sorted(list(bset - wset)),
-                "added": sorted(list(wset - bset)),
-                "kept": sorted(list(bset & wset)),
+                "removed": [x for x in baseline_top if x not in wset],
+                "added": [x for x in whatif_top if x not in bset],
+                "kept": [x for x in baseline_top if x in wset],
             }
-            st.session_state["last_debug"] = {"task": task, "baseline": base, "whatif": alt, "diff": diff}
+            _set_debug({"task": task, "baseline": base, "whatif": alt, "diff": diff})
 
             st.subheader("Porównanie")
 
-            def _render_short_list(items: list[dict[str, Any]]):
-                if not items:
-                    st.info("Brak wyników.")
-                    return
-                for i, ex in enumerate(items[:5], start=1):
-                    name = ex.get("name") or ex.get("id")
-                    st.markdown(f"**{i}. {name}**")
-                    reasons = ex.get("reasons") or []
-                    if reasons:
-                        st.caption(", ".join(reasons))
-                    sb = ex.get("score_breakdown")
-                    if isinstance(sb, dict):
-                        st.caption("score: " + ", ".join([f"{k}={v}" for k, v in sb.items()]))
-
             c1, c2 = st.columns(2)
             with c1:
                 st.markdown("### Bazowo")
@@ -218,7 +338,7 @@ with col_left:
 
             if task == "Dopasowanie":
                 match = _run_matcher(q, overrides={})
-                st.session_state["last_debug"] = {"task": task, "match": match}
+                _set_debug({"task": task, "match": match})
                 st.subheader("Rekomendacje")
                 top = match.get("top") or []
                 if top:
@@ -231,7 +351,7 @@ with col_left:
             else:
                 if knowledge == "Auto (Agent)":
                     ans, dbg_trace = agent_full.run(q, knowledge_mode="auto")
-                    st.session_state["last_debug"] = {"task": task, "knowledge": knowledge, "agent_trace": dbg_trace}
+                    _set_debug({"task": task, "knowledge": knowledge, "agent_trace": dbg_trace})
                     st.subheader("Odpowiedź")
                     st.write(ans)
 
@@ -247,22 +367,17 @@ with col_left:
                         "Jeśli kontekst jest ubogi, powiedz czego brakuje.\n\n"
                         f"KONTEKST:\n{ctx}\n\nPYTANIE:\n{q}"
                     )
-                    ans = llm.generate("Jesteś asystentem treningowym.", prompt).text
-                    st.session_state["last_debug"] = {"task": task, "knowledge": knowledge, "vector": obs}
                     st.subheader("Odpowiedź")
-                    st.write(ans)
+                    st.write_stream(llm.generate_stream("Jesteś asystentem treningowym.", prompt))
+                    _set_debug({"task": task, "knowledge": knowledge, "vector": obs})
 
                 elif knowledge == "Relacje (Graf)":
                     ql = q.lower()
-                    wants_count = any(k in ql for k in ["policz", "zlicz", "ile ", "ile ", "ile ćwicze", "ile cwicze"]) and "ćwic" in ql
-                    if wants_count and ("hantl" in ql or "dumbbell" in ql) and ("ławk" in ql or "bench" in ql):
-                        from tools.graph_rag import count_exercises_with_equipment
-
-                        allowed = []
-                        if "hantl" in ql or "dumbbell" in ql:
-                            allowed.append("dumbbell")
-                        if "ławk" in ql or "bench" in ql:
-                            allowed.append("bench")
+                    # every shortcut question mentions "ćwic"; skip the regex scan for the rest
+                    hits = {m.lastgroup for m in _GRAPH_COUNT_RE.finditer(ql)} if "ćwic" in ql else set()
+                    wants_count = "count" in hits and "exercise" in hits
+                    if wants_count and "dumbbell" in hits and "bench" in hits:
+                        allowed = [eq for eq in ("dumbbell", "bench") if eq in hits]
 
                         out = count_exercises_with_equipment(allowed, exact=False)
                         count = out.get("count", 0)
@@ -272,7 +387,7 @@ with col_left:
                         if ex:
                             st.caption("Przykłady:")
                             st.write(", ".join(ex))
-                        st.session_state["last_debug"] = {"task": task, "knowledge": knowledge, "graph": out}
+                        _set_debug({"task": task, "knowledge": knowledge, "graph": out})
                     else:
                         obs = _run_graph(q)
                         edges = obs.get("edges") or []
@@ -282,22 +397,23 @@ with col_left:
                             "Jeśli relacji jest mało, powiedz czego brakuje w grafie.\n\n"
                             f"RELACJE:\n{rels}\n\nPYTANIE:\n{q}"
                         )
-                        ans = llm.generate("Jesteś asystentem treningowym.", prompt).text
-                        st.session_state["last_debug"] = {"task": task, "knowledge": knowledge, "graph": obs}
                         st.subheader("Odpowiedź")
-                        st.write(ans)
+                        st.write_stream(llm.generate_stream("Jesteś asystentem treningowym.", prompt))
+                        _set_debug({"task": task, "knowledge": knowledge, "graph": obs})
 
                 else:
-                    va = _run_vector(q)
-                    ga = _run_graph(q)
+                    va, ga = asyncio.run(_run_retrievals(q))
 
                     vctx_items = va.get("items") or []
                     vctx = "\n\n".join([f"[source:{(it.get('meta') or {}).get('source','?')}] {(it.get('text') or '')[:600]}" for it in vctx_items[:4]])
                     gedges = ga.get("edges") or []
                     grels = "\n".join([f"{e.get('source')} -[{e.get('relation')}]-> {e.get('target')}" for e in gedges[:25]])
 
-                    v_ans = llm.generate("Jesteś asystentem treningowym.", f"KONTEKST:\n{vctx}\n\nPYTANIE:\n{q}").text
-                    g_ans = llm.generate("Jesteś asystentem treningowym.", f"RELACJE:\n{grels}\n\nPYTANIE:\n{q}").text
+                    v_resp, g_resp = llm.generate_many([
+                        ("Jesteś asystentem treningowym.", f"KONTEKST:\n{vctx}\n\nPYTANIE:\n{q}"),
+                        ("Jesteś asystentem treningowym.", f"RELACJE:\n{grels}\n\nPYTANIE:\n{q}"),
+                    ])
+                    v_ans, g_ans = v_resp.text, g_resp.text
 
                     st.subheader("Porównanie")
                     c1, c2 = st.columns(2)
@@ -308,13 +424,12 @@ with col_left:
                         st.markdown("### Relacje (Graf)")
                         st.write(g_ans)
 
-                    summary = llm.generate(
+                    st.markdown("### Podsumowanie")
+                    summary = st.write_stream(llm.generate_stream(
                         "Jesteś recenzentem.",
                         f"Porównaj krótko dwie odpowiedzi (jakość, ograniczenia, kiedy lepsza).\n\nVector:\n{v_ans}\n\nGraph:\n{g_ans}",
-                    ).text
-                    st.markdown("### Podsumowanie")
-                    st.write(summary)
-                    st.session_state["last_debug"] = {"task": task, "knowledge": knowledge, "vector": va, "graph": ga, "summary": summary}
+                    ))
+                    _set_debug({"task": task, "knowledge": knowledge, "vector": va, "graph": ga, "summary": summary})
 
 
 with col_right:
@@ -327,7 +442,8 @@ with col_right:
         if not dbg:
             st.caption("Uruchom zapytanie — tutaj pojawią się zwrócone źródła i dane pomocnicze.")
         else:
-            st.json(dbg, expanded=False)
+            with st.expander("Pokaż surowe dane", expanded=False):
+                st.json(dbg, expanded=False)
 
     with tab_run:
         if not dbg:
@@ -341,21 +457,20 @@ with col_right:
             v = dbg.get("vector") or {}
             items = v.get("items") or []
             if items:
-                st.markdown("**Dokumenty użyte do uzasadnień:**")
+                # one element per list instead of one st.write (and frontend message) per line
+                lines = ["**Dokumenty użyte do uzasadnień:**"]
                 for it in items[:10]:
                     src = (it.get("meta") or {}).get("source") or it.get("id")
                     dist = it.get("distance")
-                    if dist is None:
-                        st.write(f"- {src}")
-                    else:
-                        st.write(f"- {src} (score: {dist:.3f})")
+                    lines.append(f"- {src}" if dist is None else f"- {src} (score: {dist:.3f})")
+                st.markdown("\n".join(lines))
 
             g = dbg.get("graph") or {}
             edges = g.get("edges") or []
             if edges:
-                st.markdown("**Relacje grafu (przykładowe):**")
-                for e in edges[:10]:
-                    st.write(f"- {e.get('source')} → {e.get('relation')} → {e.get('target')}")
+                lines = ["**Relacje grafu (przykładowe):**"]
+                lines.extend(f"- {e.get('source')} → {e.get('relation')} → {e.get('target')}" for e in edges[:10])
+                st.markdown("\n".join(lines))
 
             if dbg.get("what_if"):
                 st.markdown("**Scenariusz (what‑if):**")
@@ -1,11 +1,17 @@
 from __future__ import annotations
-import json
-from typing import Any, Dict, List
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Generator, Iterator, List, Tuple
 
+import orjson
+
+from .cache import ResponseCache, from_env as _cache_from_env
 from .llm import get_llm
-from .types import AgentResult, TraceStep
+from .types import AgentResult, TraceTable
 from . import prompts
-from .utils import env_int
+from .utils import env_int, parse_json_object
 
 from tools.memory import Memory
 from tools import vector_rag, graph_rag, matcher, analytics, graph_build
@@ -14,156 +20,309 @@ from tools.history import log_event
 
 
 def _parse_json(text: str) -> Dict[str, Any]:
-    try:
-        return json.loads(text)
-    except Exception:
-        start, end = text.find("{"), text.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            try:
-                return json.loads(text[start:end + 1])
-            except Exception:
-                return {}
-        return {}
+    return parse_json_object(text) or {}
+
+
+def _dumps(obj: Any) -> str:
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
+def _compact(observation: str, max_chars: int = 600) -> str:
+    """Keep the header and as many leading lines as fit into max_chars."""
+    if len(observation) <= max_chars:
+        return observation
+    out, size = [], 0
+    for line in observation.splitlines():
+        if out and size + len(line) + 1 > max_chars:
+            break
+        out.append(line[:max_chars])
+        size += len(line) + 1
+    return "\n".join(out) + "\n…"
+
+
+_NEWLINES_TO_SPACE = str.maketrans({"\n": " "})
+_fmt_edge = "- {source} -[{relation}]-> {target}".format_map
+
+
+def _fmt_snippet(it: Dict[str, Any]) -> str:
+    txt = (it.get("text") or "").translate(_NEWLINES_TO_SPACE).strip()
+    return f"- [{it.get('id', 'unknown')}] {txt[:240]}"
 
 
 def _summarize_vector(out: Dict[str, Any]) -> str:
-    items = out.get("items", []) or []
+    items = out.get("items") or []
     if not items:
         return "Vector RAG: no matches."
-    lines = ["Vector RAG top snippets:"]
-    for it in items[:5]:
-        sid = it.get("id", "unknown")
-        txt = (it.get("text", "") or "").replace("\n", " ").strip()
-        lines.append(f"- [{sid}] {txt[:240]}")
-    return "\n".join(lines)
+    return "Vector RAG top snippets:\n" + "\n".join(map(_fmt_snippet, items[:5]))
 
 
 def _summarize_graph(out: Dict[str, Any]) -> str:
     mode = out.get("mode", "local")
-    nodes = out.get("matched_nodes", []) or []
-    edges = out.get("edges", []) or []
-    paths = out.get("paths", []) or []
+    nodes = out.get("matched_nodes") or []
+    edges = out.get("edges") or []
+    paths = out.get("paths") or []
     lines = [f"GraphRAG ({mode}) matches:"]
     if nodes:
         lines.append("Nodes: " + ", ".join(nodes[:10]))
     if edges:
         lines.append("Edges:")
-        for e in edges[:10]:
-            lines.append(f"- {e.get('source')} -[{e.get('relation')}]-> {e.get('target')}")
+        lines.extend(map(_fmt_edge, edges[:10]))
     if paths:
         lines.append("Paths:")
-        for p in paths[:5]:
-            lines.append("- " + " -> ".join(p))
+        lines.extend("- " + " -> ".join(p) for p in paths[:5])
     if out.get("warning"):
         lines.append(f"Warning: {out['warning']}")
     return "\n".join(lines)
 
 
+def _fmt_pick(it: Dict[str, Any]) -> str:
+    reasons = ", ".join(it.get("reasons") or [])
+    return f"- {it.get('name')} (score={it.get('score')}) {reasons}".strip()
+
+
+def _fmt_day(day: str, items: List[Dict[str, Any]] | None) -> str:
+    return f"- {day}: " + "; ".join(x.get("name", "") for x in (items or [])[:8])
+
+
 def _summarize_matcher(match_out: Dict[str, Any], plan_out: Dict[str, Any]) -> str:
-    top = match_out.get("top", []) or []
-    lines = [f"Matcher candidates: {match_out.get('count', 0)}", "Top picks:"]
-    for it in top[:6]:
-        reasons = ", ".join(it.get("reasons", []) or [])
-        lines.append(f"- {it.get('name')} (score={it.get('score')}) {reasons}".strip())
+    top = match_out.get("top") or []
+    lines = [f"Matcher candidates: {match_out.get('count', 0)}", "Top picks:", *map(_fmt_pick, top[:6])]
 
     plan = (plan_out.get("plan") or {})
     if plan:
-        lines.append("")
-        lines.append("3-day split (draft):")
-        for day, items in plan.items():
-            names = [x.get("name", "") for x in (items or [])][:8]
-            lines.append(f"- {day}: " + "; ".join(names))
+        lines += ["", "3-day split (draft):", *(_fmt_day(day, items) for day, items in plan.items())]
 
     return "\n".join(lines)
 
 
+def _alternation(name: str, keywords: List[str]) -> str:
+    return f"(?P<{name}>" + "|".join(map(re.escape, keywords)) + ")"
+
+
+# Keyword routes that skip the LLM router; one scan collects every tool that matched.
+_FORCED_TOOL_RE = re.compile("|".join([
+    _alternation("what_if", [
+        "what-if", "co jeśli", "co sie stanie", "co się stanie", "symul", "usuń sprzęt", "usun sprzet", "brak sprzętu", "brak sprzetu",
+    ]),
+    _alternation("analytics", [
+        "policz", "zlicz", "ile ", "suma", "średnia", "srednia", "agreg", "filtr", "posort",
+    ]),
+    # hints: route locally only when a hint is the sole match, otherwise the LLM router decides
+    _alternation("matcher", [
+        "dobierz", "dopasuj", "ułóż plan", "uloz plan", "plan trening", "match",
+    ]),
+    _alternation("graph_rag", [
+        "relacj", "zależnoś", "zaleznos", "powiązan", "powiazan", "co wynika",
+    ]),
+]))
+# Priority when several keyword routes match.
+_FORCED_TOOL_ORDER = ("what_if", "analytics")
+
+_TOOLS = ("matcher", "what_if", "analytics", "graph_build", "vector_rag", "graph_rag", "none")
+# Read-only tools that are safe to dispatch concurrently within one step.
+_PARALLEL_TOOLS = ("matcher", "vector_rag", "graph_rag")
+# Tools that take the question as free text; a forced route to one of them skips the router.
+# what_if/analytics need the router's JSON patch/spec as tool_input, so they still call it.
+_FREE_TEXT_TOOLS = frozenset({"matcher", "vector_rag", "graph_rag"})
+
+# Answers built on these read the live profile/catalog or have side effects, so they're never cached.
+_UNCACHEABLE_TOOLS = frozenset({"matcher", "what_if", "analytics", "graph_build"})
+
+@lru_cache(maxsize=1)
+def _response_cache() -> ResponseCache | None:
+    # built on first use so RESPONSE_CACHE* settings loaded from .env after import still apply
+    return _cache_from_env(vector_rag.embed_query)
+
+# Constant heads of the per-step prompts; the dynamic fields are joined on after them.
+_ROUTER_HEAD = prompts.TOOL_ROUTER + "\n---\nQuestion: "
+_REFLECTION_HEAD = prompts.REFLECTION + "\n---\nUser question: "
+_ANSWER_HEAD = prompts.ANSWER_RULES + "\n---\nUser question: "
+
+# (trace, sources, answer, answer_prompt) produced by Agent._steps
+_Investigation = Tuple[TraceTable, List[Dict[str, Any]], str, str]
+
+
 class Agent:
     def __init__(self, memory: Memory | None = None):
         self.llm = get_llm()
         self.memory = memory or Memory()
         self.max_steps = env_int("AGENT_MAX_STEPS", 3)
+        self.last_result: AgentResult | None = None
 
     def run(self, user_query: str) -> AgentResult:
-        trace: List[TraceStep] = []
+        context = self.memory.as_text()
+        cached = self._cached(user_query, context)
+        if cached is not None:
+            return cached
+
+        trace, sources, answer, answer_user = self._investigate(user_query)
+        if not answer:
+            answer = self.llm.generate(prompts.SYSTEM, answer_user).text.strip()
+        return self._finish(user_query, context, AgentResult.model_construct(answer=answer, trace=trace, sources=sources))
+
+    async def run_async(self, user_query: str) -> AgentResult:
+        """Async run(): LLM calls go through the provider's async client and
+        concurrent LLM/tool requests within a step are gathered on the loop."""
+        context = self.memory.as_text()
+        cached = self._cached(user_query, context)
+        if cached is not None:
+            return cached
+
+        trace, sources, answer, answer_user = await self._ainvestigate(user_query)
+        if not answer:
+            answer = (await self.llm.agenerate(prompts.SYSTEM, answer_user)).text.strip()
+        return self._finish(user_query, context, AgentResult.model_construct(answer=answer, trace=trace, sources=sources))
+
+    def run_stream(self, user_query: str) -> Iterator[str]:
+        """Like run(), but yield the final answer as it is decoded.
+
+        The complete AgentResult is available as self.last_result once the
+        generator is exhausted.
+        """
+        context = self.memory.as_text()
+        cached = self._cached(user_query, context)
+        if cached is not None:
+            yield cached.answer
+            return
+
+        trace, sources, answer, answer_user = self._investigate(user_query)
+        if answer:
+            yield answer
+        else:
+            parts: List[str] = []
+            for chunk in self.llm.generate_stream(prompts.SYSTEM, answer_user):
+                parts.append(chunk)
+                yield chunk
+            answer = "".join(parts).strip()
+        self._finish(user_query, context, AgentResult.model_construct(answer=answer, trace=trace, sources=sources))
+
+    def _cached(self, user_query: str, context: str) -> AgentResult | None:
+        cache = _response_cache()
+        if cache is None:
+            return None
+        cached = cache.get(user_query, context)
+        if cached is not None:
+            self.memory.add(user_query, cached.answer)
+            self.last_result = cached
+        return cached
+
+    def _finish(self, user_query: str, context: str, result: AgentResult) -> AgentResult:
+        self.memory.add(user_query, result.answer)
+        cache = _response_cache()
+        if cache is not None and not any(t in _UNCACHEABLE_TOOLS for t in result.trace.tools):
+            cache.put(user_query, context, result)
+        self.last_result = result
+        return result
+
+    def _investigate(self, user_query: str) -> _Investigation:
+        steps = self._steps(user_query)
+        reply: Any = None
+        try:
+            while True:
+                req = steps.send(reply)
+                if req[0] == "llm":
+                    reply = self.llm.generate_many(req[1])
+                elif len(req[1]) > 1:
+                    with ThreadPoolExecutor(max_workers=len(req[1])) as ex:
+                        reply = list(ex.map(lambda t: self._call_tool(t, req[2], user_query), req[1]))
+                else:
+                    reply = [self._call_tool(req[1][0], req[2], user_query)]
+        except StopIteration as done:
+            return done.value
+
+    async def _ainvestigate(self, user_query: str) -> _Investigation:
+        steps = self._steps(user_query)
+        reply: Any = None
+        try:
+            while True:
+                req = steps.send(reply)
+                if req[0] == "llm":
+                    reply = await asyncio.gather(*[self.llm.agenerate(system, user) for system, user in req[1]])
+                else:
+                    reply = await asyncio.gather(*[
+                        asyncio.to_thread(self._call_tool, t, req[2], user_query) for t in req[1]
+                    ])
+        except StopIteration as done:
+            return done.value
+
+    def _steps(self, user_query: str) -> Generator[tuple, Any, _Investigation]:
+        """Route, call tools and reflect, without doing any I/O itself.
+
+        Yields ("llm", [(system, user), ...]) and ("tools", [tool, ...], tool_input)
+        requests; the driver (_investigate / _ainvestigate) sends back the list of
+        LLMResponses or (observation, sources) pairs. Returns (trace, sources,
+        answer, answer_prompt); answer is empty when the final answer still has
+        to be generated from answer_prompt.
+        """
+        trace = TraceTable()
         sources: List[Dict[str, Any]] = []
 
         ql = (user_query or "").strip().lower()
-        if any(k in ql for k in ["what-if", "co jeśli", "co sie stanie", "co się stanie", "symul", "usuń sprzęt", "usun sprzet", "brak sprzętu", "brak sprzetu"]):
-            forced_tool = "what_if"
-        elif any(k in ql for k in ["policz", "zlicz", "ile ", "ile ćwicze", "ile cwicze", "ile jest", "suma", "średnia", "srednia", "agreg", "filtr", "posort"]):
-            forced_tool = "analytics"
+        hits = set()
+        for m in _FORCED_TOOL_RE.finditer(ql):
+            hits.add(m.lastgroup)
+            if m.lastgroup == _FORCED_TOOL_ORDER[0]:
+                break  # the top-priority route wins whatever else matches later in the question
+        forced_tool = next((t for t in _FORCED_TOOL_ORDER if t in hits), None)
+        if forced_tool is None and len(hits) == 1:
+            (forced_tool,) = hits
+
+        if forced_tool in _FREE_TEXT_TOOLS:
+            route = {"intent": "Answer the user request.", "tool": forced_tool, "tool_input": user_query}
         else:
-            forced_tool = None
-
-        router_user = f"""Question: {user_query}
-
-Conversation memory:
-{self.memory.as_text()}
-
-{prompts.TOOL_ROUTER}
-"""
-        route_raw = self.llm.generate(prompts.SYSTEM, router_user).text
-        route = _parse_json(route_raw)
+            router_user = "".join((_ROUTER_HEAD, user_query, "\n\nConversation memory:\n", self.memory.as_text(), "\n"))
+            (route_resp,) = yield ("llm", [(prompts.SYSTEM, router_user)])
+            route = _parse_json(route_resp.text)
 
         intent = (route.get("intent") or "Answer the user request.").strip()
         tool = forced_tool or (route.get("tool") or "vector_rag")
-        if tool not in ("matcher", "what_if", "analytics", "graph_build", "vector_rag", "graph_rag", "none"):
+        if tool not in _TOOLS:
             tool = "vector_rag"
         tool_input = (route.get("tool_input") or user_query).strip()
 
+        tools = [tool]
+        if not forced_tool and tool in _PARALLEL_TOOLS and isinstance(route.get("tools"), list):
+            tools = list(dict.fromkeys([tool] + [t for t in route["tools"] if t in _PARALLEL_TOOLS]))
+
         last_observation = ""
+        final_answer = ""
+        speculative_answer = ""
         for step in range(1, self.max_steps + 1):
-            if tool == "matcher":
-                m = matcher.match_exercises(tool_input)
-                p = matcher.build_3day_split(m)
-                log_event("match_result", {"query": user_query, "top": m.get("top", []), "plan": p.get("plan", {})});
-                sources.append({"type": "matcher", "items": m})
-                sources.append({"type": "plan_3day", "items": p})
-                observation = _summarize_matcher(m, p)
-
-            elif tool == "what_if":
-                patch = _parse_json(tool_input)
-                tool_out = whatif.simulate(patch if patch else {"note":"provide JSON patch"})
-                sources.append({"type":"what_if","items": tool_out})
-                observation = "What-if scenario:\n" + json.dumps(tool_out, ensure_ascii=False, indent=2)
+            results = yield ("tools", tools, tool_input)
 
-            elif tool == "analytics":
-                spec = _parse_json(tool_input)
-                tool_out = analytics.run(spec if spec else {"op":"count","by":"tag"})
-                sources.append({"type":"analytics","items": tool_out})
-                observation = "Analytics:\n" + json.dumps(tool_out, ensure_ascii=False, indent=2)
-
-            elif tool == "graph_build":
-                tool_out = graph_build.build_from_docs()
-                sources.append({"type":"graph_build","items": tool_out})
-                observation = "Graph build (LLM extraction):\n" + json.dumps(tool_out, ensure_ascii=False, indent=2)
-
-            elif tool == "vector_rag":
-                tool_out = vector_rag.query(tool_input)
-                sources.append({"type": "vector_rag", "items": tool_out.get("items", [])})
-                observation = _summarize_vector(tool_out)
-
-            elif tool == "graph_rag":
-                tool_out = graph_rag.query(tool_input)
-                sources.append({"type": "graph_rag", "items": tool_out})
-                observation = _summarize_graph(tool_out)
-
-            else:
-                observation = "No tool used."
+            for _, src in results:
+                sources.extend(src)
+            observation = "\n\n".join(obs for obs, _ in results)
 
             last_observation = observation
 
-            ref_user = f"""User question: {user_query}
-Intent: {intent}
-Tool used: {tool}
-Tool input: {tool_input}
-
-Observation:
-{observation}
+            if step == self.max_steps:
+                # no further step can follow, so a reflection would only be logged; the
+                # answer is generated from this observation right after the loop
+                for t, (obs, _) in zip(tools, results):
+                    trace.append(step, intent, t, tool_input, obs, "Final step reached.")
+                speculative_answer = ""
+                break
 
-{prompts.REFLECTION}
-"""
-            ref_raw = self.llm.generate(prompts.SYSTEM, ref_user).text
+            reflected = _compact(observation)
+            ref_user = "".join((
+                _REFLECTION_HEAD, user_query,
+                "\nIntent: ", intent,
+                "\nTool used: ", ", ".join(tools),
+                "\nTool input: ", tool_input,
+                "\n\nObservation:\n", reflected, "\n",
+            ))
+            if reflected == observation:
+                (ref_resp,) = yield ("llm", [(prompts.SYSTEM, ref_user)])
+                ref_raw, speculative_answer = ref_resp.text, ""
+            else:
+                # the inline final_answer can't be trusted on a compacted observation, so draft
+                # the real answer alongside the reflection; it's discarded if another step follows
+                ref_resp, ans_resp = yield ("llm", [
+                    (prompts.SYSTEM, ref_user),
+                    (prompts.SYSTEM, self._answer_prompt(user_query, intent, observation)),
+                ])
+                ref_raw, speculative_answer = ref_resp.text, ans_resp.text.strip()
             refj = _parse_json(ref_raw)
 
             sufficient = bool(refj.get("sufficient", True))
@@ -171,39 +330,62 @@ Observation:
             next_tool = refj.get("next_tool") or "none"
             next_tool_input = (refj.get("next_tool_input") or "").strip()
 
-            trace.append(TraceStep(
-                step=step,
-                intent=intent,
-                tool=tool,
-                tool_input=tool_input,
-                observation=observation,
-                reflection=reflection
-            ))
+            for t, (obs, _) in zip(tools, results):
+                trace.append(step, intent, t, tool_input, obs, reflection)
 
             if sufficient or next_tool == "none":
+                # the reflection only saw a compacted observation; trust its answer only if nothing was cut
+                if sufficient and reflected == observation:
+                    final_answer = (refj.get("final_answer") or "").strip()
                 break
 
-            tool = next_tool if next_tool in ("matcher", "what_if", "analytics", "graph_build", "vector_rag", "graph_rag", "none") else "vector_rag"
+            tool = next_tool if next_tool in _TOOLS else "vector_rag"
+            tools = [tool]
             tool_input = next_tool_input or tool_input
 
-        answer_user = f"""User question: {user_query}
+        answer = final_answer or speculative_answer
+        if answer:
+            return trace, sources, answer, ""
+        return trace, sources, "", self._answer_prompt(user_query, intent, last_observation)
+
+    @staticmethod
+    def _answer_prompt(user_query: str, intent: str, observation: str) -> str:
+        return "".join((
+            _ANSWER_HEAD, user_query,
+            "\n\nIntent: ", intent,
+            "\n\nMost relevant observation:\n", _compact(observation, 4000), "\n",
+        ))
+
+    def _call_tool(self, tool: str, tool_input: str, user_query: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute one tool and return (observation, sources)."""
+        match tool:
+            case "matcher":
+                m = matcher.match_exercises(tool_input)
+                p = matcher.build_3day_split(m)
+                log_event("match_result", {"query": user_query, "top": m.get("top", []), "plan": p.get("plan", {})});
+                return _summarize_matcher(m, p), [{"type": "matcher", "items": m}, {"type": "plan_3day", "items": p}]
 
-Intent: {intent}
+            case "what_if":
+                patch = _parse_json(tool_input)
+                tool_out = whatif.simulate(patch if patch else {"note":"provide JSON patch"})
+                return "What-if scenario:\n" + _dumps(tool_out), [{"type":"what_if","items": tool_out}]
 
-Most relevant observation:
-{last_observation}
+            case "analytics":
+                spec = _parse_json(tool_input)
+                tool_out = analytics.run(spec if spec else {"op":"count","by":"tag"})
+                return "Analytics:\n" + _dumps(tool_out), [{"type":"analytics","items": tool_out}]
+
+            case "graph_build":
+                tool_out = graph_build.build_from_docs()
+                return "Graph build (LLM extraction):\n" + _dumps(tool_out), [{"type":"graph_build","items": tool_out}]
 
-Write the final answer in Polish.
-Rules:
-- Be concise and actionable.
-- If you used vector_rag, cite sources as [source:<id>] using returned ids/filenames.
-- If you used graph_rag, cite relations briefly like [graph:Squat->Quads].
-- If you used matcher, cite picks like [match:<exercise_id>] and mention key reasons (equipment/injury/goal).
-- If you used analytics, cite computed results like [calc].
-- If you used graph_build, mention that the graph was extracted from docs and then queried.
-- Do NOT invent sources. If info is missing, say what's missing.
-"""
-        answer = self.llm.generate(prompts.SYSTEM, answer_user).text.strip()
+            case "vector_rag":
+                tool_out = vector_rag.query(tool_input)
+                return _summarize_vector(tool_out), [{"type": "vector_rag", "items": tool_out.get("items", [])}]
+
+            case "graph_rag":
+                tool_out = graph_rag.query(tool_input)
+                return _summarize_graph(tool_out), [{"type": "graph_rag", "items": tool_out}]
 
-        self.memory.add(user_query, answer)
-        return AgentResult(answer=answer, trace=trace, sources=sources)
+            case _:
+                return "No tool used.", []
@@ -1,20 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Tuple
 
+import orjson
+
+from core.cache import ResponseCache, from_env as _cache_from_env
 from core.llm import BaseLLM
+from core.utils import parse_json_object
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ToolCall:
     tool: str
     tool_input: Dict[str, Any]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class StepLog:
     step: int
     intent: str
@@ -24,20 +32,7 @@ class StepLog:
 
 
 def _safe_json_loads(text: str) -> Optional[Dict[str, Any]]:
-    try:
-        return json.loads(text)
-    except Exception:
-        m = None
-        try:
-            m = __import__("re").search(r"\{[\s\S]*\}", text)
-        except Exception:
-            m = None
-        if m:
-            try:
-                return json.loads(m.group(0))
-            except Exception:
-                return None
-    return None
+    return parse_json_object(text)
 
 
 def _truncate(s: str, n: int = 1800) -> str:
@@ -46,6 +41,59 @@ def _truncate(s: str, n: int = 1800) -> str:
 
 
 
+_PLANNER_SYSTEM = (
+    "You are a planning agent for a training advisor app. "
+    "You MUST use the provided tools when it improves correctness. "
+    "Return STRICT JSON only (no markdown)."
+)
+
+_TOOL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string"},
+        "tool": {
+            "type": "string",
+            "enum": ["matcher", "analytics", "what_if", "vector_rag", "graph_rag", "none"],
+        },
+        "tool_input": {"type": "object"},
+        "sufficient": {"type": "boolean"},
+        "final_answer": {"type": "string"},
+    },
+    "required": ["intent", "tool", "tool_input", "sufficient", "final_answer"],
+}
+_TOOL_SCHEMA_JSON = json.dumps(_TOOL_SCHEMA)
+
+# Constant part of the planner prompt; only the query/mode/observation suffix changes per step,
+# which keeps the prompt prefix stable for provider-side prompt caching.
+_PLANNER_PREFIX = (
+    "Decide next action. If you need structured data or evidence, call a tool. "
+    "If already sufficient, set tool=none and provide final_answer.\n\n"
+    "RETURN_JSON_SCHEMA:\n" + _TOOL_SCHEMA_JSON + "\n\n"
+    "IMPORTANT RULES:\n"
+    "- Use matcher for 'dobierz/dopasuj' and exercise recommendations.\n"
+    "- Use analytics for 'policz/zlicz/ile/średnia/rozkład/top' and aggregations.\n"
+    "- Use what_if when user asks about changes under constraints/time windows.\n"
+    "- Use vector_rag for policy/guidelines justification from documents.\n"
+    "- Use graph_rag for relations/constraints captured in graph.\n"
+    "- If knowledge_mode is 'vector', prefer vector_rag; if 'graph', prefer graph_rag; if 'compare', you may call both.\n"
+    "- Keep tool_input minimal and structured.\n\n"
+)
+
+# Answers built on these read the live profile/catalog, so they're never cached.
+_UNCACHEABLE_TOOLS = frozenset({"matcher", "what_if", "analytics"})
+
+
+def _embed_query(text: str):
+    from tools.vector_rag import embed_query
+    return embed_query(text)
+
+
+@lru_cache(maxsize=1)
+def _response_cache() -> ResponseCache | None:
+    # built on first use so RESPONSE_CACHE* settings loaded from .env after import still apply
+    return _cache_from_env(_embed_query)
+
+
 class AgentFull:
     """Tool-using reasoning agent with iterative planning and tool execution."""
 
@@ -55,55 +103,48 @@ class AgentFull:
 
     def run(self, user_query: str, knowledge_mode: str = "auto") -> Tuple[str, Dict[str, Any]]:
         """Return (final_answer, debug_trace)."""
+        cache = _response_cache()
+        if cache is not None:
+            cached = cache.get(user_query, knowledge_mode)
+            if cached is not None:
+                return cached
+
+        final, trace = self._run(user_query, knowledge_mode)
+        if (
+            cache is not None
+            and not trace.get("planner_parse_error")
+            and not any(s["tool"] in _UNCACHEABLE_TOOLS for s in trace["steps"])
+        ):
+            cache.put(user_query, knowledge_mode, (final, trace))
+        return final, trace
+
+    async def run_async(self, user_query: str, knowledge_mode: str = "auto") -> Tuple[str, Dict[str, Any]]:
+        """run() on a worker thread, for async callers.
+
+        The openai/httpx clients release the GIL while waiting on the socket, so
+        concurrent runs overlap without blocking the event loop.
+        """
+        return await asyncio.to_thread(self.run, user_query, knowledge_mode)
+
+    def _run(self, user_query: str, knowledge_mode: str) -> Tuple[str, Dict[str, Any]]:
         trace: Dict[str, Any] = {
             "type": "agent_full",
             "knowledge_mode": knowledge_mode,
             "steps": [],
         }
 
-        system = (
-            "You are a planning agent for a training advisor app. "
-            "You MUST use the provided tools when it improves correctness. "
-            "Return STRICT JSON only (no markdown)."
-        )
-
-        tool_schema = {
-            "type": "object",
-            "properties": {
-                "intent": {"type": "string"},
-                "tool": {
-                    "type": "string",
-                    "enum": ["matcher", "analytics", "what_if", "vector_rag", "graph_rag", "none"],
-                },
-                "tool_input": {"type": "object"},
-                "sufficient": {"type": "boolean"},
-                "final_answer": {"type": "string"},
-            },
-            "required": ["intent", "tool", "tool_input", "sufficient", "final_answer"],
-        }
-
         context_blocks: List[str] = []
         last_obs: str = ""
 
         for step in range(1, self.max_steps + 1):
             planner_prompt = (
-                "Decide next action. If you need structured data or evidence, call a tool. "
-                "If already sufficient, set tool=none and provide final_answer.\n\n"
-                f"USER_QUERY:\n{user_query}\n\n"
-                f"KNOWLEDGE_MODE:\n{knowledge_mode}\n\n"
-                f"PREVIOUS_OBSERVATION:\n{_truncate(last_obs, 1200)}\n\n"
-                "RETURN_JSON_SCHEMA:\n" + json.dumps(tool_schema) + "\n\n"
-                "IMPORTANT RULES:\n"
-                "- Use matcher for 'dobierz/dopasuj' and exercise recommendations.\n"
-                "- Use analytics for 'policz/zlicz/ile/średnia/rozkład/top' and aggregations.\n"
-                "- Use what_if when user asks about changes under constraints/time windows.\n"
-                "- Use vector_rag for policy/guidelines justification from documents.\n"
-                "- Use graph_rag for relations/constraints captured in graph.\n"
-                "- If knowledge_mode is 'vector', prefer vector_rag; if 'graph', prefer graph_rag; if 'compare', you may call both.\n"
-                "- Keep tool_input minimal and structured.\n"
+                _PLANNER_PREFIX
+                + f"USER_QUERY:\n{user_query}\n\n"
+                + f"KNOWLEDGE_MODE:\n{knowledge_mode}\n\n"
+                + f"PREVIOUS_OBSERVATION:\n{_truncate(last_obs, 1200)}\n"
             )
 
-            raw = self.llm.generate(system, planner_prompt).text
+            raw = self.llm.generate(_PLANNER_SYSTEM, planner_prompt).text
             plan = _safe_json_loads(raw)
             if not plan:
                 trace["planner_parse_error"] = True
@@ -111,7 +152,7 @@ class AgentFull:
                 return raw, trace
 
             intent = str(plan.get("intent", ""))
-            tool = str(plan.get("tool", "none"))
+            tool = sys.intern(str(plan.get("tool", "none")))
             tool_input = plan.get("tool_input") or {}
             sufficient = bool(plan.get("sufficient", False))
             final_answer = str(plan.get("final_answer", ""))
@@ -122,7 +163,7 @@ class AgentFull:
                 return final_answer, trace
 
             obs = self._call_tool(tool, tool_input, user_query=user_query, knowledge_mode=knowledge_mode)
-            last_obs = json.dumps(obs, ensure_ascii=False)[:5000]
+            last_obs = orjson.dumps(obs, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")[:5000]
 
             trace["steps"].append({
                 "step": step,
@@ -145,41 +186,46 @@ class AgentFull:
         return final, trace
 
     def _call_tool(self, tool: str, tool_input: Dict[str, Any], user_query: str, knowledge_mode: str) -> Dict[str, Any]:
-        if tool == "matcher":
-            from tools.matcher import match_exercises
-            payload = dict(tool_input)
-            payload.setdefault("query", user_query)
-            return match_exercises(payload)
-
-        if tool == "analytics":
-            from tools.analytics import run as analytics_run
-            return analytics_run(tool_input)
-
-        if tool == "what_if":
-            from tools.matcher import match_exercises
-            baseline = tool_input.get("baseline") or {}
-            whatif = tool_input.get("whatif") or {}
-            top_n = int(tool_input.get("top_n") or 10)
-            b = match_exercises(baseline).get("top", [])[:top_n]
-            w = match_exercises(whatif).get("top", [])[:top_n]
-            b_ids = [x.get("id") for x in b if x.get("id")]
-            w_ids = [x.get("id") for x in w if x.get("id")]
-            diff = {
-                "top_n": top_n,
-                "removed": [i for i in b_ids if i not in w_ids],
-                "added": [i for i in w_ids if i not in b_ids],
-                "kept": [i for i in b_ids if i in w_ids],
-            }
-            return {"baseline": b, "whatif": w, "diff": diff}
-
-        if tool == "vector_rag":
-            from tools.vector_rag import query as vq
-            q = tool_input.get("query") or user_query
-            return vq(q)
-
-        if tool == "graph_rag":
-            from tools.graph_rag import query as gq
-            q = tool_input.get("query") or user_query
-            return gq(q)
-
-        return {"error": f"Unknown tool: {tool}", "tool_input": tool_input}
+        match tool:
+            case "matcher":
+                from tools.matcher import match_exercises
+                payload = dict(tool_input)
+                payload.setdefault("query", user_query)
+                return match_exercises(payload)
+
+            case "analytics":
+                from tools.analytics import run as analytics_run
+                return analytics_run(tool_input)
+
+            case "what_if":
+                from tools.matcher import match_exercises
+                baseline = tool_input.get("baseline") or {}
+                whatif = tool_input.get("whatif") or {}
+                top_n = int(tool_input.get("top_n") or 10)
+                with ThreadPoolExecutor(max_workers=2) as ex:
+                    fb, fw = ex.submit(match_exercises, baseline), ex.submit(match_exercises, whatif)
+                    b = fb.result().get("top", [])[:top_n]
+                    w = fw.result().get("top", [])[:top_n]
+                b_ids = [x.get("id") for x in b if x.get("id")]
+                w_ids = [x.get("id") for x in w if x.get("id")]
+                b_set, w_set = set(b_ids), set(w_ids)
+                diff = {
+                    "top_n": top_n,
+                    "removed": [i for i in b_ids if i not in w_set],
+                    "added": [i for i in w_ids if i not in b_set],
+                    "kept": [i for i in b_ids if i in w_set],
+                }
+                return {"baseline": b, "whatif": w, "diff": diff}
+
+            case "vector_rag":
+                from tools.vector_rag import query as vq
+                q = tool_input.get("query") or user_query
+                return vq(q)
+
+            case "graph_rag":
+                from tools.graph_rag import query as gq
+                q = tool_input.get("query") or user_query
+                return gq(q)
+
+            case _:
+                return {"error": f"Unknown tool: {tool}", "tool_input": tool_input}
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .utils import env_int
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# every live ResponseCache, so index rebuilds can invalidate them without knowing their owners
+_INSTANCES: "weakref.WeakSet[ResponseCache]" = weakref.WeakSet()
+
+
+def clear_all() -> None:
+    """Clear every ResponseCache in the process (call after the docs index or graph is rebuilt)."""
+    for cache in list(_INSTANCES):
+        cache.clear()
+
+
+class ResponseCache:
+    """Two-tier cache for agent answers.
+
+    Exact tier: LRU keyed on the normalized query plus a context string
+    (conversation memory, knowledge mode, ...). Semantic tier: the query
+    embedding is compared against cached queries stored under the same context
+    and the closest one is reused when cosine similarity >= threshold.
+    Entries expire after `ttl` seconds; a changed context never matches.
+    Safe to share between threads: embeddings are computed outside the lock,
+    every read or change of the entries and semantic index happens under it.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Sequence[float]] | None = None,
+        *,
+        maxsize: int = 256,
+        ttl: float = 3600.0,
+        threshold: float = 0.95,
+    ):
+        self.embed = embed
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        # key -> (stored_at, context digest, value)
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        # semantic index: rows of _matrix are L2-normalized query embeddings, parallel to _rows
+        self._rows: List[str] = []
+        self._vectors: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        _INSTANCES.add(self)
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join((query or "").lower().split())
+
+    def _key(self, query: str, context: str) -> str:
+        return _digest(self._normalize(query) + "\x00" + context)
+
+    def _vector(self, query: str) -> Optional[np.ndarray]:
+        if self.embed is None:
+            return None
+        try:
+            vec = np.asarray(self.embed(query), dtype=np.float32)
+        except Exception:
+            # embedder failed (offline, missing model, transient error) -> exact tier only for this call
+            return None
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else None
+
+    # _live and _drop expect the caller to hold self._lock
+    def _live(self, key: str, cutoff: float) -> Optional[Tuple[float, str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < cutoff:
+            self._drop(key)
+            return None
+        return entry
+
+    def _drop(self, key: str) -> None:
+        if self._entries.pop(key, None) is None:
+            return  # never stored (or already dropped), so it has no semantic row either
+        try:
+            i = self._rows.index(key)
+        except ValueError:
+            return
+        del self._rows[i]
+        del self._vectors[i]
+        self._matrix = None
+
+    def get(self, query: str, context: str = "") -> Optional[Any]:
+        # entries stored before the cutoff have expired; one float compare per entry
+        cutoff = time.monotonic() - self.ttl
+        key = self._key(query, context)
+        with self._lock:
+            entry = self._live(key, cutoff)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[2]
+            if not self._rows:
+                return None
+
+        vec = self._vector(query)
+        if vec is None:
+            return None
+        ctx = _digest(context)
+        with self._lock:
+            # _rows/_matrix are read under the same lock hold, so row indexes stay aligned
+            if not self._rows:
+                return None
+            if self._matrix is None:
+                self._matrix = np.stack(self._vectors)
+            scores = self._matrix @ vec
+            for i in np.argsort(-scores):
+                if scores[i] < self.threshold:
+                    break
+                row_key = self._rows[i]
+                entry = self._entries.get(row_key)
+                if entry is not None and entry[1] == ctx and entry[0] >= cutoff:
+                    self._entries.move_to_end(row_key)
+                    return entry[2]
+        return None
+
+    def put(self, query: str, context: str, value: Any) -> None:
+        key = self._key(query, context)
+        vec = self._vector(query)
+        ctx = _digest(context)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic(), ctx, value)
+            if vec is not None:
+                self._rows.append(key)
+                self._vectors.append(vec)
+                self._matrix = None
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rows.clear()
+            self._vectors.clear()
+            self._matrix = None
+
+
+def from_env(embed: Callable[[str], Sequence[float]] | None = None) -> Optional[ResponseCache]:
+    """ResponseCache configured from RESPONSE_CACHE* env vars; None when RESPONSE_CACHE=0."""
+    if os.getenv("RESPONSE_CACHE", "1").strip() == "0":
+        return None
+    return ResponseCache(
+        embed,
+        maxsize=env_int("RESPONSE_CACHE_SIZE", 256),
+        ttl=float(env_int("RESPONSE_CACHE_TTL", 3600)),
+    )
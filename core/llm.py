@@ -1,19 +1,78 @@
 from __future__ import annotations
-import os, json
-from pydantic import BaseModel
+import asyncio, os, json, hashlib, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple
 from openai import OpenAI
 
-class LLMResponse(BaseModel):
+from .utils import env_int
+
+class LLMResponse(NamedTuple):
+    """Completion text; a plain NamedTuple since it only carries trusted provider output."""
     text: str
 
 class BaseLLM:
     def generate(self, system: str, user: str) -> LLMResponse:
         raise NotImplementedError
 
+    def generate_stream(self, system: str, user: str) -> Iterator[str]:
+        """Yield the completion in chunks; providers without streaming yield it whole."""
+        yield self.generate(system, user).text
+
+    async def agenerate(self, system: str, user: str) -> LLMResponse:
+        """Async generate(); providers without an async client run it in a worker thread."""
+        return await asyncio.to_thread(self.generate, system, user)
+
+    def generate_many(self, pairs: List[Tuple[str, str]]) -> List[LLMResponse]:
+        """Run independent (system, user) prompts concurrently; results keep input order."""
+        if len(pairs) <= 1:
+            return [self.generate(system, user) for system, user in pairs]
+        with ThreadPoolExecutor(max_workers=len(pairs)) as ex:
+            return list(ex.map(lambda p: self.generate(*p), pairs))
+
+async def _chat(client, model: str, system: str, user: str) -> LLMResponse:
+    resp = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ],
+    )
+    return LLMResponse(text=(resp.choices[0].message.content or ""))
+
+class _LoopClients:
+    """One async client per event loop (its connection pool is bound to the loop).
+
+    Clients of loops that have since closed are closed and dropped the next time
+    a new loop asks for one, so asyncio.run() callers don't leak a pool per run.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._clients: Dict[asyncio.AbstractEventLoop, Any] = {}
+        self._lock = threading.Lock()
+
+    async def get(self) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is not None:
+                return client
+            stale = [self._clients.pop(l) for l in [l for l in self._clients if l.is_closed()]]
+            client = self._clients[loop] = self._factory()
+        for old in stale:
+            try:
+                await old.close()
+            except Exception:
+                pass  # its connections went away with their loop
+        return client
+
 class OpenAILLM(BaseLLM):
     def __init__(self, api_key: str, model: str):
         self.client = OpenAI(api_key=api_key)
+        self.api_key = api_key
         self.model = model
+        self._aclients = _LoopClients(self._async_client)
 
     def generate(self, system: str, user: str) -> LLMResponse:
         resp = self.client.chat.completions.create(
@@ -25,6 +84,26 @@ class OpenAILLM(BaseLLM):
         )
         return LLMResponse(text=(resp.choices[0].message.content or ""))
 
+    def generate_stream(self, system: str, user: str) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _async_client(self):
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=self.api_key)
+
+    async def agenerate(self, system: str, user: str) -> LLMResponse:
+        return await _chat(await self._aclients.get(), self.model, system, user)
+
 class AzureOpenAILLM(BaseLLM):
     def __init__(self, api_key: str, endpoint: str, deployment: str, api_version: str):
         from openai import AzureOpenAI
@@ -33,7 +112,9 @@ class AzureOpenAILLM(BaseLLM):
             azure_endpoint=endpoint,
             api_version=api_version,
         )
+        self._client_kwargs = {"api_key": api_key, "azure_endpoint": endpoint, "api_version": api_version}
         self.deployment = deployment
+        self._aclients = _LoopClients(self._async_client)
 
     def generate(self, system: str, user: str) -> LLMResponse:
         resp = self.client.chat.completions.create(
@@ -45,6 +126,26 @@ class AzureOpenAILLM(BaseLLM):
         )
         return LLMResponse(text=(resp.choices[0].message.content or ""))
 
+    def generate_stream(self, system: str, user: str) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=self.deployment,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _async_client(self):
+        from openai import AsyncAzureOpenAI
+        return AsyncAzureOpenAI(**self._client_kwargs)
+
+    async def agenerate(self, system: str, user: str) -> LLMResponse:
+        return await _chat(await self._aclients.get(), self.deployment, system, user)
+
 class MockLLM(BaseLLM):
     def generate(self, system: str, user: str) -> LLMResponse:
         u = (system + "\n" + user).lower()
@@ -66,7 +167,146 @@ class MockLLM(BaseLLM):
             return LLMResponse(text=json.dumps(payload, ensure_ascii=False))
         return LLMResponse(text="(MockLLM) Brak klucza. Ustaw LLM_PROVIDER + klucze w .env.")
 
+class CachedLLM(BaseLLM):
+    """Memoizes generate() by (system, user) hash in memory and in a sqlite file,
+    so identical prompts are not re-sent across Streamlit reruns/reloads.
+
+    Both tiers are bounded: the in-memory LRU keeps `mem_size` answers, the sqlite
+    table drops rows older than `ttl` seconds and keeps at most `max_rows` newest.
+    """
+
+    _PRUNE_EVERY = 64  # puts between sqlite prunes
+
+    def __init__(
+        self,
+        inner: BaseLLM,
+        path: str = "data/cache/llm.sqlite",
+        *,
+        mem_size: int = 1024,
+        max_rows: int = 5000,
+        ttl: float = 7 * 24 * 3600.0,
+    ):
+        self.inner = inner
+        self.path = path
+        self.mem_size = mem_size
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._ns = f"{type(inner).__name__}:{getattr(inner, 'model', '') or getattr(inner, 'deployment', '')}"
+        # key -> (stored_at wall-clock seconds, text); insertion order is recency order
+        self._mem: Dict[str, Tuple[float, str]] = {}
+        self._puts = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with sqlite3.connect(self.path) as con:
+            con.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+            if "created" not in {row[1] for row in con.execute("PRAGMA table_info(llm_cache)")}:
+                # rows from before the column existed start their TTL now
+                con.execute("ALTER TABLE llm_cache ADD COLUMN created REAL NOT NULL DEFAULT 0")
+                con.execute("UPDATE llm_cache SET created = ?", (time.time(),))
+            con.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created)")
+            self._prune(con)
+
+    def _prune(self, con: sqlite3.Connection) -> None:
+        con.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl,))
+        con.execute(
+            "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    def _remember(self, key: str, created: float, text: str) -> None:
+        self._mem.pop(key, None)
+        if len(self._mem) >= self.mem_size:
+            self._mem.pop(next(iter(self._mem)), None)
+        self._mem[key] = (created, text)
+
+    def _key(self, system: str, user: str) -> str:
+        return hashlib.blake2b((self._ns + "\x00" + system + "\x00" + user).encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> str | None:
+        cutoff = time.time() - self.ttl
+        hit = self._mem.get(key)
+        if hit is not None and hit[0] >= cutoff:
+            self._remember(key, *hit)
+            return hit[1]
+        with sqlite3.connect(self.path) as con:
+            row = con.execute("SELECT created, text FROM llm_cache WHERE key = ? AND created >= ?", (key, cutoff)).fetchone()
+        if row is None:
+            self._mem.pop(key, None)
+            return None
+        self._remember(key, row[0], row[1])
+        return row[1]
+
+    def _put(self, key: str, text: str) -> None:
+        created = time.time()
+        self._puts += 1
+        with sqlite3.connect(self.path) as con:
+            con.execute("INSERT OR REPLACE INTO llm_cache (key, text, created) VALUES (?, ?, ?)", (key, text, created))
+            if self._puts % self._PRUNE_EVERY == 0:
+                self._prune(con)
+        self._remember(key, created, text)
+
+    def generate(self, system: str, user: str) -> LLMResponse:
+        key = self._key(system, user)
+        text = self._get(key)
+        if text is None:
+            text = self.inner.generate(system, user).text
+            self._put(key, text)
+        return LLMResponse(text=text)
+
+    def generate_stream(self, system: str, user: str) -> Iterator[str]:
+        key = self._key(system, user)
+        text = self._get(key)
+        if text is not None:
+            yield text
+            return
+        parts = []
+        for part in self.inner.generate_stream(system, user):
+            parts.append(part)
+            yield part
+        self._put(key, "".join(parts))
+
+    async def agenerate(self, system: str, user: str) -> LLMResponse:
+        key = self._key(system, user)
+        text = self._get(key)
+        if text is None:
+            text = (await self.inner.agenerate(system, user)).text
+            self._put(key, text)
+        return LLMResponse(text=text)
+
+    def generate_many(self, pairs: List[Tuple[str, str]]) -> List[LLMResponse]:
+        keys = [self._key(system, user) for system, user in pairs]
+        texts = [self._get(k) for k in keys]
+        misses = [i for i, t in enumerate(texts) if t is None]
+        if misses:
+            for i, resp in zip(misses, self.inner.generate_many([pairs[i] for i in misses])):
+                texts[i] = resp.text
+                self._put(keys[i], resp.text)
+        return [LLMResponse(text=t) for t in texts]
+
+def _with_cache(llm: BaseLLM) -> BaseLLM:
+    if os.getenv("LLM_CACHE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return llm
+    return CachedLLM(
+        llm,
+        path=os.getenv("LLM_CACHE_PATH", "data/cache/llm.sqlite"),
+        mem_size=max(env_int("LLM_CACHE_MEM_SIZE", 1024), 1),
+        max_rows=max(env_int("LLM_CACHE_MAX_ROWS", 5000), 1),
+        ttl=float(env_int("LLM_CACHE_TTL", 7 * 24 * 3600)),
+    )
+
+@lru_cache(maxsize=8)
+def _build_llm(provider: str, *config: str) -> BaseLLM:
+    if provider == "azure":
+        api_key, endpoint, deployment, api_version = config
+        return _with_cache(AzureOpenAILLM(api_key=api_key, endpoint=endpoint, deployment=deployment, api_version=api_version))
+    api_key, model = config
+    return _with_cache(OpenAILLM(api_key=api_key, model=model))
+
 def get_llm() -> BaseLLM:
+    """Return the configured LLM.
+
+    Clients are shared per provider config, so repeated calls reuse the same
+    HTTP connection pool instead of building a new one.
+    """
     provider = os.getenv("LLM_PROVIDER", "openai").strip().lower()
 
     if provider == "azure":
@@ -75,14 +315,14 @@ def get_llm() -> BaseLLM:
         deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT", "").strip()
         api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-06-01-preview").strip()
         if api_key and endpoint and deployment:
-            return AzureOpenAILLM(api_key=api_key, endpoint=endpoint, deployment=deployment, api_version=api_version)
+            return _build_llm("azure", api_key, endpoint, deployment, api_version)
         return MockLLM()
 
     if provider == "openai":
         api_key = os.getenv("OPENAI_API_KEY", "").strip()
         model = os.getenv("OPENAI_MODEL", "gpt-4.1-mini").strip()
         if api_key:
-            return OpenAILLM(api_key=api_key, model=model)
+            return _build_llm("openai", api_key, model)
         return MockLLM()
 
     return MockLLM()
@@ -1,3 +1,6 @@
+# Every prompt here is a constant. Callers put it first and append the per-call data after a
+# "---" line, so requests share a byte-identical prefix that providers can cache.
+
 SYSTEM = """You are an AI agent. Be helpful, concise, and explicit about tool-use decisions.
 You have tools: vector_rag (semantic snippets), graph_rag (relations/paths), and memory (conversation).
 You must:
@@ -8,7 +11,7 @@ You must:
 - Cite sources returned by tools using ids/names.
 """
 
-TOOL_ROUTER = """Given the user question, choose the best tool:
+TOOL_ROUTER = """Given the user question below, choose the best tool:
 - Use vector_rag when user asks for descriptions, recommendations, general info, or factual snippets.
 - Use graph_rag when user asks about relationships, dependencies, causes, "what leads to what", or multi-hop reasoning.
 - Use matcher when user asks to build/match a training plan based on constraints (goal, injuries, equipment, time).
@@ -18,14 +21,30 @@ Return JSON with keys:
 intent: string
 tool: one of ["matcher","what_if","analytics","vector_rag","graph_rag","graph_build","none"]
 tool_input: short query to pass into the tool
+tools: optional list of independent read-only tools (matcher, vector_rag, graph_rag) to run in parallel with the same tool_input, e.g. ["vector_rag","graph_rag"]
+"""
+
+ANSWER_RULES = """Write the final answer in Polish.
+Rules:
+- Be concise and actionable.
+- If you used vector_rag, cite sources as [source:<id>] using returned ids/filenames.
+- If you used graph_rag, cite relations briefly like [graph:Squat->Quads].
+- If you used matcher, cite picks like [match:<exercise_id>] and mention key reasons (equipment/injury/goal).
+- If you used analytics, cite computed results like [calc].
+- If you used graph_build, mention that the graph was extracted from docs and then queried.
+- Do NOT invent sources. If info is missing, say what's missing.
 """
 
-REFLECTION = """Reflect on the observation:
+REFLECTION = """Reflect on the observation below:
 - Is the observation sufficient to answer?
 - If not, propose a better tool_input for the next step (or switch tool).
+- If it is sufficient, also write the final answer for the user following the answer rules below.
 Return JSON with keys:
 sufficient: boolean
 reflection: string
 next_tool: one of ["matcher","what_if","analytics","vector_rag","graph_rag","graph_build","none"]
 next_tool_input: string
-"""
+final_answer: string (only when sufficient is true, otherwise "")
+
+Answer rules for final_answer:
+""" + ANSWER_RULES
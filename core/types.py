@@ -1,10 +1,12 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
-from typing import Any, Dict, List, Literal
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import Any, Dict, Iterator, List, Literal
 
 ToolName = Literal["vector_rag", "graph_rag", "matcher", "analytics", "graph_build", "what_if", "none"]
 
 class TraceStep(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     step: int
     intent: str
     tool: ToolName
@@ -12,7 +14,64 @@ class TraceStep(BaseModel):
     observation: str
     reflection: str
 
+class TraceTable(BaseModel):
+    """Agent trace stored column-wise (one list per TraceStep field).
+
+    Appending a step is six list appends instead of a validated model, and
+    dumping walks plain lists. Indexing and iter_steps() yield TraceStep views;
+    a list of TraceStep (or step dicts) is still accepted as input.
+    """
+    steps: List[int] = Field(default_factory=list)
+    intents: List[str] = Field(default_factory=list)
+    tools: List[ToolName] = Field(default_factory=list)
+    tool_inputs: List[str] = Field(default_factory=list)
+    observations: List[str] = Field(default_factory=list)
+    reflections: List[str] = Field(default_factory=list)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_step_list(cls, data: Any) -> Any:
+        if not isinstance(data, (list, tuple)):
+            return data
+        rows = [TraceStep.model_validate(s) for s in data]
+        return {
+            "steps": [r.step for r in rows],
+            "intents": [r.intent for r in rows],
+            "tools": [r.tool for r in rows],
+            "tool_inputs": [r.tool_input for r in rows],
+            "observations": [r.observation for r in rows],
+            "reflections": [r.reflection for r in rows],
+        }
+
+    def append(self, step: int, intent: str, tool: ToolName, tool_input: str, observation: str, reflection: str) -> None:
+        self.steps.append(step)
+        self.intents.append(intent)
+        self.tools.append(tool)
+        self.tool_inputs.append(tool_input)
+        self.observations.append(observation)
+        self.reflections.append(reflection)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __getitem__(self, i: int) -> TraceStep:
+        return TraceStep.model_construct(
+            step=self.steps[i],
+            intent=self.intents[i],
+            tool=self.tools[i],
+            tool_input=self.tool_inputs[i],
+            observation=self.observations[i],
+            reflection=self.reflections[i],
+        )
+
+    def iter_steps(self) -> Iterator[TraceStep]:
+        return (self[i] for i in range(len(self)))
+
 class AgentResult(BaseModel):
+    """Built with model_construct inside the agent (its parts are produced in-process);
+    use AgentResult.model_validate on data coming from outside."""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     answer: str
-    trace: List[TraceStep] = Field(default_factory=list)
+    trace: TraceTable = Field(default_factory=TraceTable)
     sources: List[Dict[str, Any]] = Field(default_factory=list)
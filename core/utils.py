@@ -1,8 +1,46 @@
 from __future__ import annotations
+import json
 import os
+import re
+from typing import Any, Dict, Optional
+
+import orjson
 
 def env_int(name: str, default: int) -> int:
     try:
         return int(os.getenv(name, str(default)).strip())
     except Exception:
         return default
+
+_JSON_DECODER = json.JSONDecoder()
+# JSON whitespace is ASCII-only, so \s needs no Unicode tables
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])", re.ASCII)
+
+def _first_object(text: str) -> Optional[Dict[str, Any]]:
+    start = text.find("{")
+    while start != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(obj, dict):
+                return obj
+        except ValueError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Parse the JSON object in an LLM response, or None.
+
+    Strict parse first; otherwise take the first complete object, which skips
+    ```json fences, surrounding prose and any further objects, and as a last
+    resort retry with trailing commas removed.
+    """
+    try:
+        obj = orjson.loads(text)
+        return obj if isinstance(obj, dict) else None
+    except orjson.JSONDecodeError:
+        pass
+    obj = _first_object(text)
+    if obj is None and _TRAILING_COMMA_RE.search(text):
+        obj = _first_object(_TRAILING_COMMA_RE.sub(r"\1", text))
+    return obj
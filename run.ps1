@@ -1,3 +1,7 @@
-﻿$env:SSL_CERT_FILE = (py -c "import certifi; print(certifi.where())")
-$env:REQUESTS_CA_BUNDLE = $env:SSL_CERT_FILE
+﻿if (-not $env:SSL_CERT_FILE) {
+    $env:SSL_CERT_FILE = (py -c "import certifi; print(certifi.where())")
+}
+if (-not $env:REQUESTS_CA_BUNDLE) {
+    $env:REQUESTS_CA_BUNDLE = $env:SSL_CERT_FILE
+}
 py -m gymadvisorai.app $args
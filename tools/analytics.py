@@ -4,7 +4,7 @@ from collections import Counter
 from typing import Any, Dict, List, Literal, Optional
 
 from .history import read_events
-from .json_io import default_catalog_path, load_catalog
+from .json_io import default_catalog_path, indexed_catalog
 
 Op = Literal[
     "count",
@@ -15,9 +15,19 @@ Op = Literal[
     "diff_matches",
 ]
 
+def _recent_match_events(n: int) -> List[Dict[str, Any]]:
+    """Up to n newest match_result events, newest first (scan stops at the n-th hit)."""
+    out: List[Dict[str, Any]] = []
+    for e in reversed(read_events()):
+        if e.get("type") == "match_result":
+            out.append(e)
+            if len(out) == n:
+                break
+    return out
+
 def _latest_match_event() -> Optional[Dict[str, Any]]:
-    events = [e for e in read_events() if e.get("type") == "match_result"]
-    return events[-1] if events else None
+    events = _recent_match_events(1)
+    return events[0] if events else None
 
 def run(spec: Dict[str, Any]) -> Dict[str, Any]:
     """Deterministic analytics tool.
@@ -53,17 +63,17 @@ def run(spec: Dict[str, Any]) -> Dict[str, Any]:
 
 
     if op in ("latest_match", "diff_matches"):
-        events = [e for e in read_events() if e.get("type") == "match_result"]
+        events = _recent_match_events(1 if op == "latest_match" else 2)
         if not events:
             return {"op": op, "items": [], "note": "No match history yet."}
 
         if op == "latest_match":
-            return {"op": op, "match": events[-1]}
+            return {"op": op, "match": events[0]}
 
         if len(events) < 2:
-            return {"op": op, "note": "Need at least two match runs to compute diff.", "match": events[-1]}
+            return {"op": op, "note": "Need at least two match runs to compute diff.", "match": events[0]}
 
-        a, b = events[-2], events[-1]
+        b, a = events
         a_ids = [x.get("id") for x in a.get("payload", {}).get("top", [])]
         b_ids = [x.get("id") for x in b.get("payload", {}).get("top", [])]
         a_set = set([i for i in a_ids if i])
@@ -78,8 +88,9 @@ def run(spec: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
-    catalog = load_catalog(default_catalog_path())
-    exercises = [e.model_dump() for e in catalog.exercises]
+    # parsed once per catalog file, with lower-cased tag/equipment/contraindication sets
+    rows = indexed_catalog(default_catalog_path())
+    exercises = [r[0] for r in rows]
 
     # COUNT
     if op == "count":
@@ -112,11 +123,7 @@ def run(spec: Dict[str, Any]) -> Dict[str, Any]:
         exclude_contras = set([x.lower().strip() for x in (exclude_raw or [])])
 
         out = []
-        for e in exercises:
-            eq = set([x.lower().strip() for x in e.get("equipment", [])])
-            t = set([x.lower().strip() for x in e.get("tags", [])])
-            contras = set([x.lower().strip() for x in e.get("contraindications", [])])
-
+        for e, t, eq, contras in rows:
             if equipment and not equipment.issubset(eq):
                 continue
             if tags and not tags.issubset(t):
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence, Tuple
+
+
+class EmbedBatcher:
+    """Coalesce embedding requests from concurrent callers into batched calls.
+
+    Each embed() call enqueues its text and blocks on a future. A background
+    thread collects requests for up to `window` seconds (at most `max_batch`)
+    and embeds them with a single `embed_fn(texts)` call. A caller waits at
+    most `timeout` seconds for its vector.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Sequence[Any]],
+        *,
+        max_batch: int = 64,
+        window: float = 0.02,
+        timeout: float = 60.0,
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch = max_batch
+        self.window = window
+        self.timeout = timeout
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._loop, name="embed-batcher", daemon=True)
+        self._worker.start()
+
+    def embed(self, text: str) -> Any:
+        fut: Future = Future()
+        self._queue.put((text, fut))
+        return fut.result(timeout=self.timeout)
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                vectors = self.embed_fn([t for t, _ in batch])
+                if len(vectors) != len(batch):
+                    raise RuntimeError(f"embed_fn returned {len(vectors)} vectors for {len(batch)} texts")
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), vec in zip(batch, vectors):
+                fut.set_result(vec)
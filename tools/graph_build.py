@@ -24,10 +24,9 @@ def _read_edges(path: str) -> List[dict]:
 def _write_edges(path: str, edges: List[dict]) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
     with open(path,"w",encoding="utf-8",newline="") as f:
-        w=csv.DictWriter(f, fieldnames=EDGE_FIELDS)
-        w.writeheader()
-        for e in edges:
-            w.writerow({"source": e["source"], "relation": e["relation"], "target": e["target"]})
+        w=csv.writer(f)
+        w.writerow(EDGE_FIELDS)
+        w.writerows((e["source"], e["relation"], e["target"]) for e in edges)
 
 def build_from_docs(*, docs_dir: str = "data/docs", edges_csv: str = "data/graph/edges.csv") -> Dict[str, Any]:
     """Extract edges from docs (PDF/MD/TXT) using LLM and merge into local graph."""
@@ -2,11 +2,27 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
 from typing import Any, Dict, List, Optional
 
-from .pdf_utils import load_texts_from_docs_dir
+from .pdf_utils import iter_texts_from_docs_dir
 
-@dataclass
+# Both counts in one round-trip; each subquery is answered from Neo4j's count store.
+_COUNT_CYPHER = (
+    "CALL { MATCH (n) RETURN count(n) AS nodes } "
+    "CALL { MATCH ()-[r]->() RETURN count(r) AS rels } "
+    "RETURN nodes, rels"
+)
+
+@lru_cache(maxsize=4)
+def _neo4j_graph(url: str, username: str, password: str):
+    """One Neo4jGraph (driver + schema probe) per connection config, reused across builds."""
+    from langchain_community.graphs import Neo4jGraph
+
+    return Neo4jGraph(url=url, username=username, password=password)
+
+@dataclass(slots=True, frozen=True)
 class BuildResult:
     ok: bool
     mode: str
@@ -89,13 +105,12 @@ def build_graph_with_langchain(
     if not (neo4j_url and neo4j_username and neo4j_password):
         return BuildResult(False, "bad_env", 0, 0, "Missing Neo4j env vars (NEO4J_URI/USER/PASSWORD).")
 
-    graph = Neo4jGraph(url=neo4j_url, username=neo4j_username, password=neo4j_password)
+    graph = _neo4j_graph(neo4j_url, neo4j_username, neo4j_password)
 
     # docs
-    texts = load_texts_from_docs_dir(docs_dir)
+    texts = list(islice(iter_texts_from_docs_dir(docs_dir), max_docs))
     if not texts:
         return BuildResult(False, "no_docs", 0, 0, f"No docs found in {docs_dir}.")
-    texts = texts[:max_docs]
     docs = [Document(page_content=t, metadata={"source": f"doc_{i}"}) for i, t in enumerate(texts)]
 
     transformer = LLMGraphTransformer(llm=llm)
@@ -107,10 +122,9 @@ def build_graph_with_langchain(
     nodes = 0
     rels = 0
     try:
-        result = graph.query("MATCH (n) RETURN count(n) as c")
-        nodes = int(result[0]["c"])
-        result = graph.query("MATCH ()-[r]->() RETURN count(r) as c")
-        rels = int(result[0]["c"])
+        result = graph.query(_COUNT_CYPHER)
+        nodes = int(result[0]["nodes"])
+        rels = int(result[0]["rels"])
     except Exception:
         pass
 
@@ -1,15 +1,91 @@
 from __future__ import annotations
 
+import atexit
 import os
 import csv
-import json
 import re
-from typing import Any, Dict, List, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 import networkx as nx
+import orjson
+
+from core.cache import clear_all as _clear_response_caches
+from core.utils import env_int
+
+
+# query results keyed on (mode, graph file mtime, query_text), least recently used evicted first;
+# the mtime makes a rebuild by another process (scripts/ingest_graph.py) a miss, an in-process
+# ingest clears it outright
+_QUERY_CACHE: Dict[Tuple[str, Optional[float], str], Dict[str, Any]] = {}
+_QUERY_CACHE_MAX = 512
+# count_exercises_with_equipment results keyed on (sorted allowed, exact, graph_json, its mtime)
+_COUNT_CACHE: Dict[Tuple[Tuple[str, ...], bool, str, float], Dict[str, Any]] = {}
+# parsed local graph per source file: path -> (mtime, graph)
+_GRAPH_CACHE: Dict[str, Tuple[float, nx.MultiDiGraph]] = {}
+# "requires" edges per graph.json: path -> (mtime, exercise -> normalized equipment set)
+_REQUIRES_CACHE: Dict[str, Tuple[float, Dict[str, set]]] = {}
+
+
+def _cypher(text: str) -> str:
+    # one line, single spaces: smaller Bolt payload and a plan-cache key independent of source layout
+    return " ".join(text.split())
+
+
+# Cypher is kept constant and parameterized so Neo4j's plan cache is hit on every call;
+# $tokens arrive lowercased so the per-row filter only lowercases the node names, and all
+# tokens are tested in one pass over the relationships (each edge is returned at most once).
+_NEO4J_QUERY = _cypher("""
+MATCH (a)-[r]->(b)
+WHERE any(tok IN $tokens WHERE toLower(a.name) CONTAINS tok OR toLower(b.name) CONTAINS tok)
+RETURN a.name AS source, type(r) AS relation, b.name AS target
+LIMIT $limit
+""")
+
+# MERGE on Entity.name needs this index to be a seek instead of a label scan per row.
+_NEO4J_INDEX = "CREATE INDEX entity_name IF NOT EXISTS FOR (n:Entity) ON (n.name)"
+
+# Entities are merged once per distinct name; the edge rows then only MATCH their endpoints
+# instead of re-merging the same node for every edge it takes part in. Both passes run as one
+# statement (one round-trip, one transaction); count(*) collapses the first pass to a single row.
+_NEO4J_INGEST = _cypher("""UNWIND $names AS name
+MERGE (:Entity {name: name})
+WITH count(*) AS merged
+UNWIND $rows AS row
+MATCH (a:Entity {name: row.source})
+MATCH (b:Entity {name: row.target})
+MERGE (a)-[r:REL {type: row.relation}]->(b)
+SET r.source_file = row.source_file
+""")
+
+# Large ingests: the server commits every $batch rows itself, so the whole file is sent once
+# instead of as one client round-trip per batch. CALL ... IN TRANSACTIONS only runs in an
+# auto-commit transaction (session.run), never inside an explicit or managed one.
+_NEO4J_INGEST_LARGE = 5000
+_NEO4J_INGEST_ENTITIES_TX = _cypher("""UNWIND $names AS name
+CALL { WITH name MERGE (:Entity {name: name}) } IN TRANSACTIONS OF $batch ROWS
+""")
+_NEO4J_INGEST_EDGES_TX = _cypher("""UNWIND $rows AS row
+CALL {
+  WITH row
+  MATCH (a:Entity {name: row.source})
+  MATCH (b:Entity {name: row.target})
+  MERGE (a)-[r:REL {type: row.relation}]->(b)
+  SET r.source_file = row.source_file
+} IN TRANSACTIONS OF $batch ROWS
+""")
+
+
+def _clear_caches() -> None:
+    # agent answers built on the old graph are stale too
+    _clear_response_caches()
+    _QUERY_CACHE.clear()
+    _COUNT_CACHE.clear()
+    _GRAPH_CACHE.clear()
+    _REQUIRES_CACHE.clear()
 
 
 def _norm(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").strip().lower())
+    return " ".join((s or "").lower().split())
 
 
 def _dedup_edges(edges: List[Dict[str, str]]) -> List[Dict[str, str]]:
@@ -36,8 +112,8 @@ def generate_edges_from_catalog(catalog_json: str = "data/catalog/exercises.json
     """
     if not os.path.exists(catalog_json):
         return []
-    with open(catalog_json, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(catalog_json, "rb") as f:
+        data = orjson.loads(f.read())
 
     exercises = data.get("exercises") if isinstance(data, dict) else data
     if not isinstance(exercises, list):
@@ -72,6 +148,29 @@ def generate_edges_from_catalog(catalog_json: str = "data/catalog/exercises.json
     return _dedup_edges(edges)
 
 
+def _requires_index(graph_json: str) -> Dict[str, set]:
+    """Exercise -> required equipment from graph.json; rebuilt only when the file changes."""
+    mtime = os.path.getmtime(graph_json)
+    hit = _REQUIRES_CACHE.get(graph_json)
+    if hit and hit[0] == mtime:
+        return hit[1]
+
+    with open(graph_json, "rb") as f:
+        data = orjson.loads(f.read())
+
+    req_map: Dict[str, set] = {}
+    for e in data.get("edges", []) or []:
+        if _norm(e.get("relation")) != "requires":
+            continue
+        src = e.get("source")
+        tgt = e.get("target")
+        if not src or not tgt:
+            continue
+        req_map.setdefault(src, set()).add(_norm(str(tgt)))
+    _REQUIRES_CACHE[graph_json] = (mtime, req_map)
+    return req_map
+
+
 def count_exercises_with_equipment(
     allowed_equipment: List[str],
     exact: bool = False,
@@ -89,21 +188,14 @@ def count_exercises_with_equipment(
     if not os.path.exists(graph_json):
         ingest_edges_to_json()
 
-    with open(graph_json, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    req_map: Dict[str, set] = {}
-    for e in data.get("edges", []) or []:
-        if _norm(e.get("relation")) != "requires":
-            continue
-        src = e.get("source")
-        tgt = e.get("target")
-        if not src or not tgt:
-            continue
-        req_map.setdefault(src, set()).add(_norm(str(tgt)))
+    # the file's mtime is part of the key, so a rewrite by another process is a miss too
+    key = (tuple(sorted(allowed)), exact, graph_json, os.path.getmtime(graph_json))
+    cached = _COUNT_CACHE.get(key)
+    if cached is not None:
+        return cached
 
     hits = []
-    for ex_name, reqs in req_map.items():
+    for ex_name, reqs in _requires_index(graph_json).items():
         if exact:
             ok = reqs == allowed
         else:
@@ -112,13 +204,15 @@ def count_exercises_with_equipment(
             hits.append(ex_name)
 
     hits_sorted = sorted(hits, key=lambda x: x.lower())
-    return {
+    out = {
         "type": "graph_count",
         "allowed": sorted(list(allowed)),
         "exact": exact,
         "count": len(hits_sorted),
         "exercise_names": hits_sorted,
     }
+    _COUNT_CACHE[key] = out
+    return out
 
 def _normalize_neo4j_uri(uri: str) -> str:
     """Return a driver URI that avoids routing issues when possible.
@@ -136,41 +230,97 @@ def _normalize_neo4j_uri(uri: str) -> str:
     return u
 
 
-def _open_driver_with_fallback(uri: str, auth: tuple[str, str]):
+def _open_driver_with_fallback(uri: str, auth: tuple[str, str], **config: Any):
     """Try routing URI; if it fails, retry with direct bolt scheme."""
     from neo4j import GraphDatabase
     try:
-        return GraphDatabase.driver(uri, auth=auth)
+        return GraphDatabase.driver(uri, auth=auth, **config)
     except Exception:
         u2 = _normalize_neo4j_uri(uri)
         if u2 != uri:
-            return GraphDatabase.driver(u2, auth=auth)
+            return GraphDatabase.driver(u2, auth=auth, **config)
         raise
 
 
+@lru_cache(maxsize=4)
+def _driver(uri: str, user: str, pwd: str):
+    """Process-wide driver per connection config; the driver pools sessions and is thread-safe.
+
+    Pool size and acquisition timeout come from NEO4J_POOL_SIZE (default 50) and
+    NEO4J_ACQUIRE_TIMEOUT seconds (default 30), so the TLS handshake is paid once
+    per pooled connection instead of once per query. Pooled connections are kept
+    alive and recycled after NEO4J_CONN_LIFETIME seconds (default 3600).
+    """
+    driver = _open_driver_with_fallback(
+        uri,
+        auth=(user, pwd),
+        max_connection_pool_size=env_int("NEO4J_POOL_SIZE", 50),
+        connection_acquisition_timeout=float(env_int("NEO4J_ACQUIRE_TIMEOUT", 30)),
+        max_connection_lifetime=float(env_int("NEO4J_CONN_LIFETIME", 3600)),
+        keep_alive=True,
+    )
+    atexit.register(driver.close)
+    return driver
+
+
+@lru_cache(maxsize=4)
+def _ensure_index(uri: str, user: str, pwd: str) -> None:
+    """Run the schema DDL once per connection config; later ingests skip the round-trip."""
+    with _driver(uri, user, pwd).session() as session:
+        session.run(_NEO4J_INDEX).consume()
+
+
 def _neo4j_configured() -> bool:
     return bool(os.getenv("NEO4J_URI","").strip() and os.getenv("NEO4J_USER","").strip() and os.getenv("NEO4J_PASSWORD","").strip())
 
-def _load_local_graph(path_json: str = "data/graph/graph.json") -> nx.MultiDiGraph:
+def _read_local_graph(path: str) -> nx.MultiDiGraph:
     g = nx.MultiDiGraph()
-    if os.path.exists(path_json):
-        with open(path_json, "r", encoding="utf-8") as f:
-            data = json.load(f)
+    if path.endswith(".json"):
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
         for e in data.get("edges", []):
             g.add_edge(e["source"], e["target"], relation=e.get("relation","related_to"))
-        return g
-    csv_path = "data/graph/edges.csv"
-    if os.path.exists(csv_path):
-        with open(csv_path, "r", encoding="utf-8") as f:
+    else:
+        with open(path, "r", encoding="utf-8") as f:
             reader = csv.DictReader(f)
             for row in reader:
                 g.add_edge(row["source"], row["target"], relation=row.get("relation","related_to"))
+    # (node, lower-cased name) in node order, so queries don't lower-case every node name again
+    g.graph["names_lower"] = [(n, str(n).lower()) for n in g.nodes()]
+    return g
+
+def _local_graph_path(path_json: str = "data/graph/graph.json") -> str:
+    return path_json if os.path.exists(path_json) else "data/graph/edges.csv"
+
+def _load_local_graph(path_json: str = "data/graph/graph.json") -> nx.MultiDiGraph:
+    """Local graph from graph.json (or edges.csv); parsed once and rebuilt only when the file changes.
+
+    The returned graph is shared between callers and must not be mutated.
+    """
+    path = _local_graph_path(path_json)
+    if not os.path.exists(path):
+        return nx.MultiDiGraph()
+    mtime = os.path.getmtime(path)
+    hit = _GRAPH_CACHE.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    g = _read_local_graph(path)
+    _GRAPH_CACHE[path] = (mtime, g)
     return g
 
 def _query_local(g: nx.MultiDiGraph, query_text: str, max_hops: int = 2) -> Dict[str, Any]:
     q = query_text.lower()
-    tokens = [t for t in [w.strip(".,!?;:()[]{}").lower() for w in q.split()] if len(t) > 2]
-    matched = [n for n in g.nodes() if any(t in str(n).lower() for t in tokens)][:5]
+    tokens = [t for t in [w.strip(".,!?;:()[]{}") for w in q.split()] if len(t) > 2]
+    matched = []
+    if tokens:
+        # all tokens in one alternation: one C-level scan per node name instead of a Python loop per token
+        hit = re.compile("|".join(map(re.escape, tokens))).search
+        names = g.graph.get("names_lower") or [(n, str(n).lower()) for n in g.nodes()]
+        for n, name in names:
+            if hit(name):
+                matched.append(n)
+                if len(matched) == 5:
+                    break
 
     edges_out = []
     for n in matched:
@@ -195,28 +345,64 @@ def _query_local(g: nx.MultiDiGraph, query_text: str, max_hops: int = 2) -> Dict
 
     return {"type":"graph_rag","mode":"local","matched_nodes": matched, "edges": edges_out[:20], "paths": paths[:5]}
 
+def _neo4j_tokens(query_text: str) -> List[str]:
+    return [t.lower() for t in query_text.split() if len(t) > 2][:6]
+
+
+def _neo4j_result(edges: List[Dict[str, str]], limit: int) -> Dict[str, Any]:
+    nodes = list({e["source"] for e in edges} | {e["target"] for e in edges})
+    return {"type":"graph_rag","mode":"neo4j","matched_nodes": nodes[:20], "edges": edges[:limit], "paths": []}
+
+
 def _query_neo4j(query_text: str, limit: int = 25) -> Dict[str, Any]:
-    from neo4j import GraphDatabase
     uri = os.getenv("NEO4J_URI")
     user = os.getenv("NEO4J_USER")
     pwd = os.getenv("NEO4J_PASSWORD")
 
-    tokens = [t for t in query_text.split() if len(t) > 2][:6]
-    cypher = """
-    UNWIND $tokens AS tok
-    MATCH (a)-[r]->(b)
-    WHERE toLower(a.name) CONTAINS toLower(tok) OR toLower(b.name) CONTAINS toLower(tok)
-    RETURN a.name AS source, type(r) AS relation, b.name AS target
-    LIMIT $limit
+    edges = []
+    with _driver(uri, user, pwd).session() as session:
+        for rec in session.run(_NEO4J_QUERY, tokens=_neo4j_tokens(query_text), limit=limit):
+            edges.append({"source": rec["source"], "relation": rec["relation"], "target": rec["target"]})
+    return _neo4j_result(edges, limit)
+
+
+def warm() -> bool:
+    """Open the pooled Neo4j driver and run the read query once with a dummy token.
+
+    The first real question then reuses a connected pool, cached plans and a warm
+    page cache instead of paying for all three. Returns False when Neo4j is not
+    configured or unreachable.
     """
+    if not _neo4j_configured():
+        return False
+    uri = os.getenv("NEO4J_URI")
+    user = os.getenv("NEO4J_USER")
+    pwd = os.getenv("NEO4J_PASSWORD")
+    try:
+        with _driver(uri, user, pwd).session() as session:
+            session.run(_NEO4J_QUERY, tokens=["__warm__"], limit=1).consume()
+    except Exception:
+        return False
+    return True
+
+
+def _query_key(mode: str, query_text: str) -> Tuple[str, Optional[float], str]:
+    if mode == "neo4j" and _neo4j_configured():
+        return (mode, None, query_text)  # the server's state isn't observable from here
+    path = _local_graph_path()
+    return (mode, os.path.getmtime(path) if os.path.exists(path) else None, query_text)
+
+def _cached_query(key: Tuple[str, Optional[float], str]) -> Optional[Dict[str, Any]]:
+    out = _QUERY_CACHE.pop(key, None)
+    if out is not None:
+        _QUERY_CACHE[key] = out  # re-insert: most recently used entries sit at the end
+    return out
+
+def _remember_query(key: Tuple[str, Optional[float], str], out: Dict[str, Any]) -> None:
+    if len(_QUERY_CACHE) >= _QUERY_CACHE_MAX:
+        _QUERY_CACHE.pop(next(iter(_QUERY_CACHE)), None)
+    _QUERY_CACHE[key] = out
 
-    edges = []
-    with GraphDatabase.driver(uri, auth=(user, pwd)) as driver:
-        with driver.session() as session:
-            for rec in session.run(cypher, tokens=tokens, limit=limit):
-                edges.append({"source": rec["source"], "relation": rec["relation"], "target": rec["target"]})
-    nodes = list({e["source"] for e in edges} | {e["target"] for e in edges})
-    return {"type":"graph_rag","mode":"neo4j","matched_nodes": nodes[:20], "edges": edges[:limit], "paths": []}
 
 def query(query_text: str) -> Dict[str, Any]:
     """Query graph relations.
@@ -227,18 +413,26 @@ def query(query_text: str) -> Dict[str, Any]:
     """
 
     mode = (os.getenv("GRAPH_RAG_MODE") or "local").strip().lower()
+    key = _query_key(mode, query_text)
+    cached = _cached_query(key)
+    if cached is not None:
+        return cached
 
     if mode == "neo4j" and _neo4j_configured():
         try:
-            return _query_neo4j(query_text)
+            out = _query_neo4j(query_text)
         except Exception as e:
             g = _load_local_graph()
             out = _query_local(g, query_text)
             out["warning"] = f"Neo4j failed; using local graph. Error: {e}"
             return out
+        _remember_query(key, out)
+        return out
 
     g = _load_local_graph()
-    return _query_local(g, query_text)
+    out = _query_local(g, query_text)
+    _remember_query(key, out)
+    return out
 
 
 def query_graph_local(query_text: str, top_k: int = 25) -> Dict[str, Any]:
@@ -273,38 +467,38 @@ def ingest_edges_to_json(edges_csv: str = "data/graph/edges.csv", out_json: str
     edges = _dedup_edges(edges)
 
     os.makedirs(os.path.dirname(out_json), exist_ok=True)
-    with open(out_json, "w", encoding="utf-8") as f:
-        json.dump({"edges": edges}, f, ensure_ascii=False, indent=2)
+    with open(out_json, "wb") as f:
+        f.write(orjson.dumps({"edges": edges}, option=orjson.OPT_INDENT_2))
+    _clear_caches()
     return {"edges": len(edges), "out": out_json, "note": "Merged edges.csv + catalog-derived edges."}
 
 
 def ingest_edges_to_neo4j(edges_csv: str = "data/graph/edges.csv") -> str:
-    import csv
-
     uri = os.getenv("NEO4J_URI","").strip()
     user = os.getenv("NEO4J_USER","").strip()
     pwd = os.getenv("NEO4J_PASSWORD","").strip()
     if not (uri and user and pwd):
         return "Missing Neo4j env vars (NEO4J_URI/USER/PASSWORD)."
 
-    from neo4j import GraphDatabase
-    driver = _open_driver_with_fallback(uri, auth=(user, pwd))
-
-    rows = []
+    # one row per (source, relation, target): duplicates would only repeat the same MERGE;
+    # the last duplicate wins, as its SET did when every row was sent
     with open(edges_csv, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for r in reader:
-            rows.append(r)
-
-    q = """UNWIND $rows AS row
-    MERGE (a:Entity {name: row.source})
-    MERGE (b:Entity {name: row.target})
-    MERGE (a)-[r:REL {type: row.relation}]->(b)
-    SET r.source_file = coalesce(row.source_file, row.source_file)
-    """
-
-    with driver.session() as session:
-        session.run(q, rows=rows)
+        rows = list({(r["source"], r["relation"], r["target"]): r for r in csv.DictReader(f)}.values())
+
+    # one transaction per batch keeps server-side transaction state bounded on large edge files
+    batch = max(env_int("NEO4J_INGEST_BATCH", 1000), 1)
+    _ensure_index(uri, user, pwd)
+    with _driver(uri, user, pwd).session() as session:
+        if len(rows) > _NEO4J_INGEST_LARGE:
+            # entities first: the edge pass MATCHes them and its batches commit independently
+            names = list(dict.fromkeys(n for r in rows for n in (r["source"], r["target"])))
+            session.run(_NEO4J_INGEST_ENTITIES_TX, names=names, batch=batch).consume()
+            session.run(_NEO4J_INGEST_EDGES_TX, rows=rows, batch=batch).consume()
+        else:
+            for start in range(0, len(rows), batch):
+                chunk = rows[start:start + batch]
+                names = list(dict.fromkeys(n for r in chunk for n in (r["source"], r["target"])))
+                session.run(_NEO4J_INGEST, names=names, rows=chunk).consume()
 
-    driver.close()
+    _clear_caches()
     return f"Ingested {len(rows)} edges into Neo4j."
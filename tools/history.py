@@ -1,8 +1,10 @@
 from __future__ import annotations
-import json, os
+import os
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
+import orjson
+
 DEFAULT_LOG_PATH = "data/history/events.jsonl"
 
 def log_event(event_type: str, payload: Dict[str, Any], *, path: str = DEFAULT_LOG_PATH) -> None:
@@ -12,20 +14,25 @@ def log_event(event_type: str, payload: Dict[str, Any], *, path: str = DEFAULT_L
         "type": event_type,
         "payload": payload,
     }
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    with open(path, "ab") as f:
+        f.write(orjson.dumps(rec, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE))
 
 def read_events(*, path: str = DEFAULT_LOG_PATH, limit: int = 200) -> list[dict]:
     if not os.path.exists(path):
         return []
+    with open(path, "rb") as f:
+        lines = f.read().splitlines()
+    # parse newest-first and stop after `limit` valid events; older lines are never decoded
     out = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                out.append(json.loads(line))
-            except Exception:
-                continue
-    return out[-limit:]
+    for line in reversed(lines):
+        if len(out) >= limit:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            out.append(orjson.loads(line))
+        except orjson.JSONDecodeError:
+            continue
+    out.reverse()
+    return out
@@ -1,6 +1,7 @@
 from __future__ import annotations
-import json, os
-from typing import Any, Dict, List, Union
+import os
+from typing import Any, Dict, FrozenSet, List, Tuple, Union
+import orjson
 from pydantic import BaseModel, Field, field_validator
 
 class UserProfile(BaseModel):
@@ -52,14 +53,56 @@ class ExerciseCatalog(BaseModel):
     exercises: List[Exercise] = Field(default_factory=list)
 
 def load_json(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
 
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+# model_validate_json parses and validates in one pass (no intermediate dict tree)
 def load_profile(path: str) -> UserProfile:
-    return UserProfile.model_validate(load_json(path))
+    return UserProfile.model_validate_json(_read_bytes(path))
 
 def load_catalog(path: str) -> ExerciseCatalog:
-    return ExerciseCatalog.model_validate(load_json(path))
+    return ExerciseCatalog.model_validate_json(_read_bytes(path))
+
+# (exercise dict, tags, equipment, contraindications) with lower-cased feature sets
+CatalogRow = Tuple[Dict[str, Any], FrozenSet[str], FrozenSet[str], FrozenSet[str]]
+# rows, term -> bit over every equipment/contraindication term, (equipment, contraindication) masks per row
+CatalogIndex = Tuple[List[CatalogRow], Dict[str, int], List[Tuple[int, int]]]
+_CATALOG_INDEX_CACHE: Dict[str, Tuple[float, CatalogIndex]] = {}
+
+def lower_set(vals: List[str]) -> FrozenSet[str]:
+    return frozenset(v.lower().strip() for v in vals or [])
+
+def term_mask(bits: Dict[str, int], terms: FrozenSet[str]) -> int:
+    m = 0
+    for t in terms:
+        m |= bits.get(t, 0)
+    return m
+
+def catalog_index(path: str) -> CatalogIndex:
+    """Catalog rows with precomputed feature sets and bitmasks; rebuilt only when the file changes."""
+    mtime = os.path.getmtime(path)
+    hit = _CATALOG_INDEX_CACHE.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    rows: List[CatalogRow] = []
+    for ex in load_catalog(path).exercises:
+        exd = ex.model_dump()
+        rows.append((exd, lower_set(exd.get("tags", [])), lower_set(exd.get("equipment", [])), lower_set(exd.get("contraindications", []))))
+    bits: Dict[str, int] = {}
+    for _, _, eq, contras in rows:
+        for t in eq | contras:
+            bits.setdefault(t, 1 << len(bits))
+    masks = [(term_mask(bits, eq), term_mask(bits, contras)) for _, _, eq, contras in rows]
+    index = (rows, bits, masks)
+    _CATALOG_INDEX_CACHE[path] = (mtime, index)
+    return index
+
+def indexed_catalog(path: str) -> List[CatalogRow]:
+    return catalog_index(path)[0]
 
 def default_profile_path() -> str:
     return os.getenv("PROFILE_JSON", "data/input/profile.json")
@@ -1,10 +0,0 @@
-from __future__ import annotations
-import json
-from typing import Any, Dict
-
-def load_json(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def loads_json(text: str) -> Dict[str, Any]:
-    return json.loads(text)
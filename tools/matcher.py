@@ -1,30 +1,40 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
+import heapq
+import os
+from operator import itemgetter
+from typing import Any, Dict, FrozenSet, List, Tuple
 
 from .json_io import (
-    load_profile, load_catalog,
+    catalog_index, lower_set, term_mask,
     default_profile_path, default_catalog_path,
     UserProfile,
 )
 
-def _has_equipment(ex_eq: List[str], available: List[str]) -> bool:
-    if not ex_eq:
-        return True
-    avail = {a.lower().strip() for a in available}
-    return all(e.lower().strip() in avail for e in ex_eq)
-
-def _contra_ok(contras: List[str], injuries: List[str], avoid: List[str]) -> bool:
-    bad = {x.lower().strip() for x in injuries + avoid}
-    return not any(c.lower().strip() in bad for c in contras)
-
-def _score_exercise(ex: Dict[str, Any], profile: UserProfile) -> Tuple[float, Dict[str, float], List[str]]:
+# parsed profiles keyed on the raw file bytes (the what-if scenario file is rewritten in place)
+_PROFILE_CACHE: Dict[bytes, UserProfile] = {}
+# match_exercises results keyed on (effective profile JSON, catalog path, catalog mtime, top_k)
+_MATCH_CACHE: Dict[Tuple[str, str, float, int], Dict[str, Any]] = {}
+_MAX_CACHED = 128
+
+def _cached_profile(path: str) -> UserProfile:
+    """Parsed profile, shared between calls; callers copy it before changing fields."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    profile = _PROFILE_CACHE.get(raw)
+    if profile is None:
+        if len(_PROFILE_CACHE) >= _MAX_CACHED:
+            _PROFILE_CACHE.clear()
+        profile = _PROFILE_CACHE[raw] = UserProfile.model_validate_json(raw)
+    return profile
+
+def _score_exercise(ex: Dict[str, Any], profile: UserProfile, tags: FrozenSet[str], eq: FrozenSet[str],
+                    injuries: FrozenSet[str], prefs: FrozenSet[str]) -> Tuple[float, Dict[str, float], List[str]]:
     score = 0.0
     breakdown: Dict[str, float] = {}
     reasons: List[str] = []
 
     goal = profile.goal.lower()
-    tags = {t.lower() for t in ex.get("tags", [])}
 
     if goal == "hypertrophy" and "hypertrophy" in tags:
         breakdown["goal"] = 2.0
@@ -35,15 +45,12 @@ def _score_exercise(ex: Dict[str, Any], profile: UserProfile) -> Tuple[float, Di
     else:
         breakdown["goal"] = 0.5
 
-    injuries = {x.lower() for x in profile.injuries_limitations}
     if "shoulder_pressing_pain" in injuries and ("shoulder_friendly" in tags or "neutral_grip" in tags):
         breakdown["injury"] = 1.5
         reasons.append("shoulder-friendly")
     else:
         breakdown["injury"] = 0.0
 
-    prefs = {p.lower() for p in profile.preferences}
-    eq = {e.lower() for e in ex.get("equipment", [])}
     if "dumbbells" in prefs and "dumbbell" in eq:
         breakdown["prefs"] = 0.8
         reasons.append("pref: dumbbells")
@@ -116,43 +123,63 @@ def match_exercises(user_request: Any = "", *, profile_path: str | None = None,
     profile_path = profile_path or default_profile_path()
     catalog_path = catalog_path or default_catalog_path()
 
-    profile = load_profile(profile_path)
+    profile = _cached_profile(profile_path)
     if isinstance(user_request, dict):
         profile = _override_profile(profile, user_request)
-    catalog = load_catalog(catalog_path)
-
-    available = profile.equipment_available
-    injuries = profile.injuries_limitations
-    avoid = profile.avoid
-
-    candidates: List[Dict[str, Any]] = []
-    for ex in catalog.exercises:
-        exd = ex.model_dump()
-        if not _has_equipment(exd.get("equipment", []), available):
+    # the result depends only on the effective profile and the catalog, so repeated
+    # calls (baseline runs, what-if pairs, agent retries) are served from memory
+    key = (profile.model_dump_json(), catalog_path, os.path.getmtime(catalog_path), top_k)
+    hit = _MATCH_CACHE.get(key)
+    if hit is not None:
+        return hit
+    rows, bits, masks = catalog_index(catalog_path)
+
+    # hard filters as int bit tests; terms the catalog never mentions cannot change the outcome
+    available = term_mask(bits, lower_set(profile.equipment_available))
+    bad = term_mask(bits, lower_set(profile.injuries_limitations + profile.avoid))
+
+    # lower-cased once per call, not once per candidate
+    injuries = frozenset(x.lower() for x in profile.injuries_limitations)
+    prefs = frozenset(p.lower() for p in profile.preferences)
+
+    # (rounded score, breakdown, reasons, exercise) per candidate; dicts are built for the top_k only
+    scored: List[Tuple[float, Dict[str, float], List[str], Dict[str, Any]]] = []
+    for (exd, tags, eq, contras), (eq_mask, contra_mask) in zip(rows, masks):
+        if eq_mask & ~available:
             continue
-        if not _contra_ok(exd.get("contraindications", []), injuries, avoid):
+        if contra_mask & bad:
             continue
 
-        s, br, reasons = _score_exercise(exd, profile)
-        candidates.append({
-            "id": exd["id"],
-            "name": exd["name"],
-            "score": round(s, 3),
-            "score_breakdown": {k: round(v, 3) for k, v in br.items()},
-            "reasons": reasons,
-            "muscles_primary": exd.get("muscles_primary", []),
-            "equipment": exd.get("equipment", []),
-            "tags": exd.get("tags", []),
-        })
-
-    candidates.sort(key=lambda x: x["score"], reverse=True)
-    return {
+        s, br, reasons = _score_exercise(exd, profile, tags, eq, injuries, prefs)
+        scored.append((round(s, 3), br, reasons, exd))
+
+    # nlargest == sorted(..., reverse=True)[:top_k] (ties keep catalog order) without sorting everything
+    candidates = [{
+        "id": exd["id"],
+        "name": exd["name"],
+        "score": score,
+        "score_breakdown": {k: round(v, 3) for k, v in br.items()},
+        "reasons": reasons,
+        "muscles_primary": exd.get("muscles_primary", []),
+        "equipment": exd.get("equipment", []),
+        "tags": exd.get("tags", []),
+    } for score, br, reasons, exd in heapq.nlargest(top_k, scored, key=itemgetter(0))]
+    out = {
         "type": "matcher",
         "profile": profile.model_dump(),
-        "top": candidates[:top_k],
-        "count": len(candidates),
+        "top": candidates,
+        "count": len(scored),
         "note": "Hard filters: equipment + contraindications. Ranking: goal/injury/preferences/level.",
     }
+    if len(_MATCH_CACHE) >= _MAX_CACHED:
+        _MATCH_CACHE.clear()
+    _MATCH_CACHE[key] = out
+    return out
+
+_PREHAB_TAGS = frozenset({"rotator_cuff","scapular","prehab"})
+_PUSH_MUSCLES = frozenset({"chest","shoulders","triceps"})
+_PULL_MUSCLES = frozenset({"back","lats","biceps","rear delts"})
+_LEGS_MUSCLES = frozenset({"quads","hamstrings","glutes","calves"})
 
 def build_3day_split(match_result: Dict[str, Any]) -> Dict[str, Any]:
     top = match_result.get("top", [])
@@ -160,22 +187,21 @@ def build_3day_split(match_result: Dict[str, Any]) -> Dict[str, Any]:
     for ex in top:
         muscles = {m.lower() for m in (ex.get("muscles_primary") or [])}
         tags = {t.lower() for t in (ex.get("tags") or [])}
-        if {"rotator_cuff","scapular","prehab"} & tags:
+        if _PREHAB_TAGS & tags:
             prehab.append(ex)
-        elif muscles & {"chest","shoulders","triceps"}:
+        elif _PUSH_MUSCLES & muscles:
             push.append(ex)
-        elif muscles & {"back","lats","biceps","rear delts"}:
+        elif _PULL_MUSCLES & muscles:
             pull.append(ex)
-        elif muscles & {"quads","hamstrings","glutes","calves"}:
+        elif _LEGS_MUSCLES & muscles:
             legs.append(ex)
 
-    def pick(lst, n): return lst[:n] if lst else []
     return {
         "type": "plan_3day",
         "plan": {
-            "day1_push": pick(push, 5) + pick(prehab, 2),
-            "day2_pull": pick(pull, 5) + pick(prehab, 2),
-            "day3_legs": pick(legs, 5) + pick(prehab, 1),
+            "day1_push": push[:5] + prehab[:2],
+            "day2_pull": pull[:5] + prehab[:2],
+            "day3_legs": legs[:5] + prehab[:1],
         },
         "guidance": "Main: 3–4 sets x 6–12 reps. Accessories/prehab: 2–3 sets x 12–20 reps.",
     }
@@ -1,20 +1,27 @@
 from __future__ import annotations
+from collections import deque
+from itertools import islice
 from dataclasses import dataclass, field
-from typing import List, Tuple
+from typing import Deque, Optional, Tuple
+
+MAX_TURNS = 8
+RENDER_TURNS = 6
 
 @dataclass
 class Memory:
-    turns: List[Tuple[str, str]] = field(default_factory=list)
+    turns: Deque[Tuple[str, str]] = field(default_factory=lambda: deque(maxlen=MAX_TURNS))
+    _text: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.turns, deque) or self.turns.maxlen != MAX_TURNS:
+            self.turns = deque(self.turns, maxlen=MAX_TURNS)
 
     def add(self, user: str, assistant: str) -> None:
         self.turns.append((user, assistant))
-        self.turns = self.turns[-8:]
+        self._text = None
 
     def as_text(self) -> str:
-        if not self.turns:
-            return ""
-        lines = []
-        for u, a in self.turns[-6:]:
-            lines.append(f"User: {u}")
-            lines.append(f"Assistant: {a}")
-        return "\n".join(lines)
+        if self._text is None:
+            recent = islice(self.turns, max(len(self.turns) - RENDER_TURNS, 0), None)
+            self._text = "\n".join(f"User: {u}\nAssistant: {a}" for u, a in recent)
+        return self._text
@@ -10,11 +10,13 @@ def read_pdf_text(path: str, max_chars: int = 200_000) -> str:
 
     reader = PdfReader(path)
     parts: List[str] = []
+    total = 0
     for page in reader.pages:
         txt = page.extract_text() or ""
         if txt.strip():
             parts.append(txt)
-        if sum(len(p) for p in parts) >= max_chars:
+            total += len(txt)
+        if total >= max_chars:
             break
     out = "\n\n".join(parts).strip()
     return out[:max_chars]
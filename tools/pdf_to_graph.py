@@ -1,8 +1,9 @@
 from __future__ import annotations
-import os, csv, re
+import os, csv
 from typing import Any, Dict, List, Tuple
 
 from core.llm import get_llm
+from core.utils import env_int, parse_json_object
 from .pdf_reader import read_pdf_text
 
 EDGE_FIELDS = ["source","relation","target"]
@@ -16,16 +17,14 @@ Rules:
 - Do NOT include explanations, only JSON.
 """
 
+# The instructions are the same for every chunk, so they travel as the system message and
+# each request only differs in its user message (stable prefix for provider prompt caching).
+_SYSTEM = "You output JSON only.\n\n" + _PROMPT
+
 def _chunk(text: str, max_chars: int = 3500) -> List[str]:
-    text = re.sub(r"\s+", " ", text).strip()
-    if not text:
-        return []
-    chunks = []
-    i = 0
-    while i < len(text):
-        chunks.append(text[i:i+max_chars])
-        i += max_chars
-    return chunks
+    # split()/join collapses every whitespace run (same set as \s) without the regex engine
+    text = " ".join(text.split())
+    return [text[i:i+max_chars] for i in range(0, len(text), max_chars)]
 
 def extract_graph_from_docs(docs_dir: str = "data/docs", out_csv: str = "data/graph/edges_llm.csv", *, max_chunks: int = 12) -> Dict[str, Any]:
     llm = get_llm()
@@ -48,34 +47,34 @@ def extract_graph_from_docs(docs_dir: str = "data/docs", out_csv: str = "data/gr
     edges: List[Dict[str,str]] = []
     seen = set()
 
-    for name, txt in texts:
-        for ch in _chunk(txt)[:max_chunks]:
-            user = _PROMPT + "\n\nTEXT:\n" + ch
-            raw = llm.generate("You output JSON only.", user).text
-            start, end = raw.find("{"), raw.rfind("}")
-            if start == -1 or end == -1 or end <= start:
+    pairs = [(_SYSTEM, "TEXT:\n" + ch) for _, txt in texts for ch in _chunk(txt)[:max_chunks]]
+    # chunks are independent: send them `workers` at a time, responses come back in chunk order
+    workers = max(env_int("GRAPH_EXTRACT_WORKERS", 4), 1)
+    responses = []
+    for i in range(0, len(pairs), workers):
+        responses.extend(llm.generate_many(pairs[i:i+workers]))
+
+    for resp in responses:
+        obj = parse_json_object(resp.text)
+        if not obj:
+            continue
+        for e in obj.get("edges", []) or []:
+            s = str(e.get("source","")).strip()
+            r = str(e.get("relation","")).strip()
+            t = str(e.get("target","")).strip()
+            if not (s and r and t):
                 continue
-            import json
-            try:
-                obj = json.loads(raw[start:end+1])
-            except Exception:
+            key = (s.lower(), r.lower(), t.lower())
+            if key in seen:
                 continue
-            for e in obj.get("edges", []) or []:
-                s = str(e.get("source","")).strip()
-                r = str(e.get("relation","")).strip()
-                t = str(e.get("target","")).strip()
-                if not (s and r and t):
-                    continue
-                key = (s.lower(), r.lower(), t.lower())
-                if key in seen:
-                    continue
-                seen.add(key)
-                edges.append({"source": s, "relation": r, "target": t})
+            seen.add(key)
+            edges.append({"source": s, "relation": r, "target": t})
 
     os.makedirs(os.path.dirname(out_csv), exist_ok=True)
     with open(out_csv, "w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=EDGE_FIELDS)
-        w.writeheader()
-        w.writerows(edges)
+        # plain tuples: DictWriter would re-check every row's keys against the field names
+        w = csv.writer(f)
+        w.writerow(EDGE_FIELDS)
+        w.writerows((e["source"], e["relation"], e["target"]) for e in edges)
 
     return {"out_csv": out_csv, "edges": len(edges), "docs": [n for n,_ in texts]}
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import os
-from typing import List
+from typing import Iterator, List
+
+from .pdf_reader import read_pdf_text
 
 def _read_text_file(path: str) -> str:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
@@ -9,32 +11,26 @@ def _read_text_file(path: str) -> str:
 
 def _read_pdf(path: str) -> str:
     try:
-        from pypdf import PdfReader
-    except Exception:
-        return ""
-    try:
-        reader = PdfReader(path)
-        parts = []
-        for page in reader.pages:
-            parts.append(page.extract_text() or "")
-        return "\n".join(parts)
+        return read_pdf_text(path)
     except Exception:
         return ""
 
-def load_texts_from_docs_dir(docs_dir: str = "data/docs") -> List[str]:
+def iter_texts_from_docs_dir(docs_dir: str = "data/docs") -> Iterator[str]:
+    """Yield non-empty document texts one file at a time; stopping early skips the remaining reads."""
     if not os.path.exists(docs_dir):
-        return []
-    out: List[str] = []
+        return
     for root, _, files in os.walk(docs_dir):
         for fn in files:
             p = os.path.join(root, fn)
             ext = os.path.splitext(fn.lower())[1]
             if ext in [".md", ".txt"]:
                 txt = _read_text_file(p).strip()
-                if txt:
-                    out.append(txt)
             elif ext == ".pdf":
                 txt = _read_pdf(p).strip()
-                if txt:
-                    out.append(txt)
-    return out
+            else:
+                continue
+            if txt:
+                yield txt
+
+def load_texts_from_docs_dir(docs_dir: str = "data/docs") -> List[str]:
+    return list(iter_texts_from_docs_dir(docs_dir))
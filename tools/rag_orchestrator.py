@@ -1,8 +1,21 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Set, Tuple
 
 
+def _guarded(tool: str, query_text: str) -> Dict[str, Any]:
+    try:
+        if tool == "vector_rag":
+            from .vector_rag import query as _query
+        else:
+            from .graph_rag import query as _query
+
+        return _query(query_text)
+    except Exception as e:
+        return {"error": str(e)}
+
+
 def query(query_text: str, run_vector: bool = True, run_graph: bool = True) -> Dict[str, Any]:
     """Call both Vector RAG and Graph RAG and return a merged view.
 
@@ -12,24 +25,12 @@ def query(query_text: str, run_vector: bool = True, run_graph: bool = True) -> D
     """
     out: Dict[str, Any] = {"type": "rag_orchestrator", "query": query_text}
 
-    vector_obs = None
-    graph_obs = None
-
-    if run_vector:
-        try:
-            from .vector_rag import query as _vquery
-
-            vector_obs = _vquery(query_text)
-        except Exception as e:
-            vector_obs = {"error": str(e)}
-
-    if run_graph:
-        try:
-            from .graph_rag import query as _gquery
-
-            graph_obs = _gquery(query_text)
-        except Exception as e:
-            graph_obs = {"error": str(e)}
+    # both lookups are I/O bound (Chroma/embeddings, Neo4j), so they run side by side
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_vector = ex.submit(_guarded, "vector_rag", query_text) if run_vector else None
+        f_graph = ex.submit(_guarded, "graph_rag", query_text) if run_graph else None
+    vector_obs = f_vector.result() if f_vector else None
+    graph_obs = f_graph.result() if f_graph else None
 
     # Build a merged summary
     matched_nodes: Set[Tuple[str, str]] = set()
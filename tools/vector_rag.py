@@ -1,43 +1,134 @@
 from __future__ import annotations
 import os, glob
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
 import chromadb
 from chromadb.utils import embedding_functions
 
+from core.cache import clear_all as _clear_response_caches
+
+from .embed_batcher import EmbedBatcher
 from .pdf_reader import read_pdf_text
 
-def _client() -> chromadb.PersistentClient:
-    persist_dir = os.getenv("CHROMA_PERSIST_DIR", "data/indexes/chroma")
+# query results keyed on (index mtime, query_text, top_k), least recently used evicted first;
+# the mtime makes a rebuild by another process (scripts/ingest_docs.py) a miss, an in-process
+# ingest clears it outright
+_QUERY_CACHE: Dict[Tuple[Optional[float], str, int], Dict[str, Any]] = {}
+_QUERY_CACHE_MAX = 512
+
+@lru_cache(maxsize=4)
+def _client_for(persist_dir: str) -> chromadb.PersistentClient:
     return chromadb.PersistentClient(path=persist_dir)
 
-def _collection(client: chromadb.PersistentClient):
-    api_key = os.getenv("OPENAI_API_KEY", "").strip()
-    if api_key:
-        ef = embedding_functions.OpenAIEmbeddingFunction(
-            api_key=api_key,
+def _persist_dir() -> str:
+    return os.getenv("CHROMA_PERSIST_DIR", "data/indexes/chroma")
+
+def _client() -> chromadb.PersistentClient:
+    return _client_for(_persist_dir())
+
+def _index_version() -> Optional[float]:
+    path = os.path.join(_persist_dir(), "chroma.sqlite3")
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def _cached_query(key: Tuple[Optional[float], str, int]) -> Optional[Dict[str, Any]]:
+    out = _QUERY_CACHE.pop(key, None)
+    if out is not None:
+        _QUERY_CACHE[key] = out  # re-insert: most recently used entries sit at the end
+    return out
+
+def _remember_query(key: Tuple[Optional[float], str, int], out: Dict[str, Any]) -> None:
+    if len(_QUERY_CACHE) >= _QUERY_CACHE_MAX:
+        _QUERY_CACHE.pop(next(iter(_QUERY_CACHE)), None)
+    _QUERY_CACHE[key] = out
+
+def embedding_backend() -> str:
+    """Name of the embedding model the index is built with (it follows OPENAI_API_KEY)."""
+    if os.getenv("OPENAI_API_KEY", "").strip():
+        return "openai:text-embedding-3-small"
+    return "sentence-transformers:all-MiniLM-L6-v2"
+
+# embedding function and batcher are cached per backend, so a changed OPENAI_API_KEY picks
+# the matching model instead of the one built first
+@lru_cache(maxsize=2)
+def _embedding_function_for(backend: str):
+    if backend.startswith("openai:"):
+        return embedding_functions.OpenAIEmbeddingFunction(
+            api_key=os.getenv("OPENAI_API_KEY", "").strip(),
             model_name="text-embedding-3-small",
         )
-    else:
-        ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-    return client.get_or_create_collection("docs", embedding_function=ef)
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+
+def _embedding_function():
+    return _embedding_function_for(embedding_backend())
+
+# one client and collection handle per index directory, instead of a new client and a
+# get_or_create_collection round-trip to Chroma's sqlite on every query
+@lru_cache(maxsize=4)
+def _collection(client: chromadb.PersistentClient):
+    # metadata is only stored when the collection is created; ingest_docs compares it
+    return client.get_or_create_collection(
+        "docs", embedding_function=_embedding_function(), metadata={"embedding": embedding_backend()}
+    )
+
+@lru_cache(maxsize=2)
+def _batcher_for(backend: str) -> EmbedBatcher:
+    return EmbedBatcher(_embedding_function_for(backend))
+
+def _batcher() -> EmbedBatcher:
+    return _batcher_for(embedding_backend())
+
+# query embeddings keyed on text; kept across index rebuilds unless the embedding model changes
+_EMBED_CACHE: Dict[str, Any] = {}
+_EMBED_CACHE_MAX = 2048
+
+def _reset_embedding_caches() -> None:
+    """Drop every handle and vector tied to the previous embedding model."""
+    _collection.cache_clear()
+    _embedding_function_for.cache_clear()
+    _batcher_for.cache_clear()
+    _EMBED_CACHE.clear()
+
+def _remember(text: str, vec: Any) -> None:
+    if len(_EMBED_CACHE) >= _EMBED_CACHE_MAX:
+        _EMBED_CACHE.pop(next(iter(_EMBED_CACHE)), None)
+    _EMBED_CACHE[text] = vec
+
+def embed_query(text: str):
+    """Query embedding; concurrent callers share one embeddings request via the batcher."""
+    vec = _EMBED_CACHE.get(text)
+    if vec is None:
+        vec = _batcher().embed(text)
+        _remember(text, vec)
+    return vec
+
+def _read_doc(path: str) -> str:
+    if os.path.splitext(path)[1].lower() == ".pdf":
+        return read_pdf_text(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
 
 def ingest_docs(docs_dir: str = "data/docs") -> Dict[str, Any]:
     """Each file -> one document (MVP). Supports .txt/.md/.pdf (PDF must have text layer)."""
     client = _client()
     col = _collection(client)
+    if (col.metadata or {}).get("embedding") != embedding_backend():
+        # built with another embedding model (or before it was recorded): its vectors have
+        # a different size, so start the collection over instead of adding to it
+        client.delete_collection("docs")
+        _reset_embedding_caches()
+        col = _collection(client)
 
     paths = []
     for ext in ("*.txt", "*.md", "*.pdf"):
         paths.extend(glob.glob(os.path.join(docs_dir, ext)))
 
+    # files are read concurrently so their I/O overlaps; map() keeps them in path order
+    with ThreadPoolExecutor(max_workers=min(len(paths), 8) or 1) as ex:
+        texts = list(ex.map(_read_doc, paths))
+
     ids, docs, metas = [], [], []
-    for p in paths:
-        ext = os.path.splitext(p)[1].lower()
-        if ext == ".pdf":
-            txt = read_pdf_text(p)
-        else:
-            with open(p, "r", encoding="utf-8") as f:
-                txt = f.read()
+    for p, txt in zip(paths, texts):
         txt = (txt or "").strip()
         if not txt:
             continue
@@ -52,14 +143,21 @@ def ingest_docs(docs_dir: str = "data/docs") -> Dict[str, Any]:
         except Exception:
             pass
         col.add(ids=ids, documents=docs, metadatas=metas)
+    _QUERY_CACHE.clear()
+    _clear_response_caches()
 
     return {"ingested": len(ids), "files": [os.path.basename(p) for p in paths]}
 
 def query(query_text: str, top_k: int = 5) -> Dict[str, Any]:
+    top_k = int(os.getenv("RAG_TOP_K", str(top_k)))
+    key = (_index_version(), query_text, top_k)
+    cached = _cached_query(key)
+    if cached is not None:
+        return cached
+
     client = _client()
     col = _collection(client)
-    top_k = int(os.getenv("RAG_TOP_K", str(top_k)))
-    res = col.query(query_texts=[query_text], n_results=top_k, include=["documents","metadatas","distances"])
+    res = col.query(query_embeddings=[embed_query(query_text)], n_results=top_k, include=["documents","metadatas","distances"])
     items = []
     for i in range(len(res["ids"][0])):
         items.append({
@@ -68,4 +166,6 @@ def query(query_text: str, top_k: int = 5) -> Dict[str, Any]:
             "meta": res["metadatas"][0][i],
             "distance": res["distances"][0][i],
         })
-    return {"type": "vector_rag", "items": items}
+    out = {"type": "vector_rag", "items": items}
+    _remember_query(key, out)
+    return out
@@ -1,7 +1,9 @@
 from __future__ import annotations
-import os, json, copy
+import os, copy
 from typing import Any, Dict
 
+import orjson
+
 from .json_io import load_profile, default_profile_path
 from .matcher import match_exercises, build_3day_split
 from .history import log_event
@@ -18,8 +20,8 @@ def simulate(profile_patch: Dict[str, Any], *, top_k: int = 10) -> Dict[str, Any
         data[k] = v
 
     os.makedirs(os.path.dirname(SCENARIO_PATH), exist_ok=True)
-    with open(SCENARIO_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with open(SCENARIO_PATH, "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
     m = match_exercises("", profile_path=SCENARIO_PATH, top_k=top_k)
     p = build_3day_split(m)